@@ -0,0 +1,278 @@
+# analytics.py
+from collections import Counter
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+from . import db
+from .models import User, CSVUpload, Comment
+
+# Scopes understood by scope_teachers, from widest to narrowest
+SCOPES = ("all", "campus", "college", "program", "teacher")
+
+# Aggregations below run over the Comments table, so uploads saved before it
+# existed must be migrated with `flask backfill-comments` to be counted.
+
+def file_sort_key(filename):
+    """ Orders '<start>_<end>_<sem>' filenames chronologically, anything else last """
+    try:
+        start, end, sem = map(int, filename.split('_'))
+        return (start, end, sem)
+    except (ValueError, AttributeError):
+        return (9999, 9999, 9)
+
+def load_upload_columns(upload):
+    """ Returns (comments, sentiments, topics) for an upload, preferring the Comments table """
+    if upload.comment_rows:
+        rows = upload.comment_rows
+        return [row.text for row in rows], [row.sentiment for row in rows], [row.topic for row in rows]
+    # Uploads saved before the Comments table existed and not yet backfilled
+    return upload.chunk_items('comments'), upload.chunk_items('sentiment'), upload.chunk_items('topics')
+
+def scope_teachers(scope, campus_acronym=None, college_name=None, program_acronym=None, teacher_uname=None):
+    """ Active teachers inside an all/campus/college/program/teacher scope """
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown analytics scope: {scope}")
+
+    filters = {"userType": "Teacher", "isDeleted": False}
+    if scope in ("campus", "college", "program"):
+        filters["campus_acronym"] = campus_acronym
+    if scope in ("college", "program"):
+        filters["college_name"] = college_name
+    if scope == "program":
+        filters["program_acronym"] = program_acronym
+    if scope == "teacher":
+        filters["uName"] = teacher_uname
+    return User.query.filter_by(**filters).all()
+
+def scope_uploads(teacher_unames):
+    """ Uploads of the given teachers with their comment rows eager-loaded """
+    return CSVUpload.query.options(selectinload(CSVUpload.comment_rows)).filter(
+        CSVUpload.teacher_uname.in_(teacher_unames)
+    ).all()
+
+def aggregate_uploads(uploads):
+    """
+    Build the files/sentiment/topics/comments payload used by the analytics and report endpoints.
+
+    Uploads sharing a filename (re-uploads of a semester) are merged oldest first,
+    files are ordered chronologically, and every comment is visited exactly once.
+    """
+    grouped = {}
+    for upload in sorted(uploads, key=lambda x: x.upload_date):
+        grouped.setdefault(upload.filename, []).append(upload)
+
+    files = sorted(grouped.keys(), key=file_sort_key)
+    all_sentiments = []
+    all_topics = []
+    all_comments = []
+
+    for filename in files:
+        file_uploads = grouped[filename]
+        if len(file_uploads) == 1:
+            comments, sentiments, topics = load_upload_columns(file_uploads[0])
+        else:
+            comments, sentiments, topics = [], [], []
+            for upload in file_uploads:
+                upload_comments, upload_sentiments, upload_topics = load_upload_columns(upload)
+                comments.extend(upload_comments)
+                sentiments.extend(upload_sentiments)
+                topics.extend(upload_topics)
+
+        n_comments, n_sentiments, n_topics = len(comments), len(sentiments), len(topics)
+        for idx in range(max(n_comments, n_sentiments, n_topics)):
+            if idx < n_sentiments:
+                corresponding_sentiment = sentiments[idx]
+                all_sentiments.append({"filename": filename, "sentiment_score": corresponding_sentiment})
+            else:
+                corresponding_sentiment = "Unknown"
+
+            corresponding_topic = None
+            if idx < n_topics:
+                topic_entry = topics[idx]
+                if isinstance(topic_entry, dict):
+                    topic = topic_entry.get("topic")
+                    sentiment = topic_entry.get("sentiment", corresponding_sentiment)
+                    if topic is not None and sentiment is not None:
+                        all_topics.append({"topic": topic, "sentiment": sentiment})
+                    corresponding_topic = topic_entry.get("topic", "Unknown")
+                else:
+                    all_topics.append({"topic": topic_entry, "sentiment": corresponding_sentiment})
+                    corresponding_topic = topic_entry
+
+            if idx < n_comments:
+                comment_entry = comments[idx]
+                if isinstance(comment_entry, dict):
+                    text = comment_entry.get("text")
+                    sentiment = comment_entry.get("sentiment", corresponding_sentiment)
+                    topic = comment_entry.get("topic", corresponding_topic)
+                    if text:
+                        all_comments.append({
+                            "text": text,
+                            "sentiment": sentiment if sentiment else "Unknown",
+                            "topic": topic if topic else "Unknown"
+                        })
+                else:
+                    all_comments.append({
+                        "text": comment_entry,
+                        "sentiment": corresponding_sentiment,
+                        "topic": corresponding_topic if corresponding_topic else "Unknown"
+                    })
+
+    return {
+        "files": files,
+        "sentiment": all_sentiments,
+        "topics": all_topics,
+        "comments": all_comments
+    }
+
+def teacher_topic_index(uploads, all_sentiments):
+    """
+    {teacher_uname: Counter({(topic, sentiment): n})} over every topic entry of each upload.
+
+    Plain-string topic entries take their sentiment from all_sentiments at the
+    position of the topic's first occurrence in the upload, which is how the
+    teacher performance figures have always been computed.
+    """
+    index = {}
+    for upload in uploads:
+        topics_upload = load_upload_columns(upload)[2]
+        first_seen = {}
+        counts = index.setdefault(upload.teacher_uname, Counter())
+        for position, topic_entry in enumerate(topics_upload):
+            if isinstance(topic_entry, dict):
+                counts[(topic_entry.get("topic"), topic_entry.get("sentiment"))] += 1
+                continue
+            first = first_seen.setdefault(topic_entry, position)
+            sentiment = all_sentiments[first]["sentiment_score"] if first < len(all_sentiments) else "Unknown"
+            counts[(topic_entry, sentiment)] += 1
+    return index
+
+def teacher_performance(teachers, uploads, all_sentiments, all_topics):
+    """
+    {teacher_uname: {"doing_well": n, "not_doing_well": n}}.
+
+    Each topic entry in a teacher's uploads counts once per mention of that
+    topic across the whole scope, so the work is linear in the number of
+    comments instead of topics x uploads.
+    """
+    topic_mentions = Counter(topic_data["topic"] for topic_data in all_topics)
+    performance = {teacher.uName: {"doing_well": 0, "not_doing_well": 0} for teacher in teachers}
+
+    for teacher_uname, counts in teacher_topic_index(uploads, all_sentiments).items():
+        if teacher_uname not in performance:
+            continue
+        for (topic, sentiment), total in counts.items():
+            weight = topic_mentions.get(topic, 0) * total
+            if sentiment == "Negative":
+                performance[teacher_uname]["not_doing_well"] += weight
+            elif sentiment == "Positive":
+                performance[teacher_uname]["doing_well"] += weight
+    return performance
+
+def _scoped(query, teacher_unames):
+    return query.join(CSVUpload, CSVUpload.upload_id == Comment.upload_id).filter(
+        CSVUpload.teacher_uname.in_(teacher_unames)
+    )
+
+def sentiment_counts_by_file(teacher_unames):
+    """ {filename: {"Positive": n, "Negative": n, ...}} computed with one GROUP BY """
+    rows = _scoped(
+        db.session.query(CSVUpload.filename, Comment.sentiment, func.count(Comment.comment_id)),
+        teacher_unames
+    ).group_by(CSVUpload.filename, Comment.sentiment).all()
+
+    counts = {}
+    for filename, sentiment, total in rows:
+        file_counts = counts.setdefault(filename, {"Positive": 0, "Negative": 0})
+        key = sentiment or "Unknown"
+        file_counts[key] = file_counts.get(key, 0) + total
+    return counts
+
+def topic_sentiment_counts(teacher_unames):
+    """ [{"topic", "Positive", "Negative", "total"}] ordered by number of mentions """
+    rows = _scoped(
+        db.session.query(Comment.topic, Comment.sentiment, func.count(Comment.comment_id)),
+        teacher_unames
+    ).filter(Comment.topic.isnot(None)).group_by(Comment.topic, Comment.sentiment).all()
+
+    counts = {}
+    for topic, sentiment, total in rows:
+        topic_counts = counts.setdefault(topic, {"topic": topic, "Positive": 0, "Negative": 0, "total": 0})
+        key = sentiment or "Unknown"
+        topic_counts[key] = topic_counts.get(key, 0) + total
+        topic_counts["total"] += total
+    return sorted(counts.values(), key=lambda item: item["total"], reverse=True)
+
+def topic_sentiment_buckets(file_data):
+    """
+    One pass over the comments of analysis file_data entries.
+
+    Returns (buckets, topic_totals, sentiment_totals): buckets maps each topic to
+    its {"Positive": [...], "Negative": [...]} comments in order of first
+    appearance, topic_totals counts every comment with a topic, and
+    sentiment_totals counts the sentiment labels. Comments, sentiments and
+    topics are aligned by position within each file.
+    """
+    buckets = {}
+    topic_totals = Counter()
+    sentiment_totals = Counter()
+    for file in file_data:
+        comments = file.get("comments", [])
+        sentiments = file.get("sentiment", [])
+        topics = file.get("topics", [])
+        sentiment_totals.update(sentiments)
+
+        for comment, topic, sentiment in zip(comments, topics, sentiments):
+            if not topic:
+                continue
+            topic_totals[topic] += 1
+            if sentiment == "Positive" or sentiment == "Negative":
+                bucket = buckets.get(topic)
+                if bucket is None:
+                    bucket = buckets[topic] = {"Positive": [], "Negative": []}
+                bucket[sentiment].append(comment)
+        # Comments past the end of the sentiment list still count towards their topic
+        for topic in topics[len(sentiments):len(comments)]:
+            if topic:
+                topic_totals[topic] += 1
+    return buckets, topic_totals, sentiment_totals
+
+def summarize_scope(teacher_unames):
+    """ Count-only analytics payload for a set of teachers """
+    sentiment_counts = sentiment_counts_by_file(teacher_unames)
+    return {
+        "files": sorted(sentiment_counts.keys(), key=file_sort_key),
+        "sentiment_counts": sentiment_counts,
+        "topic_counts": topic_sentiment_counts(teacher_unames),
+        "total_comments": sum(sum(counts.values()) for counts in sentiment_counts.values())
+    }
+
+def page_comments(teacher_unames, page=1, per_page=100, topic=None, sentiment=None, filename=None):
+    """ One page of raw comments for a set of teachers, optionally filtered """
+    query = _scoped(
+        db.session.query(CSVUpload.filename, Comment.text, Comment.sentiment, Comment.topic),
+        teacher_unames
+    )
+    if topic:
+        query = query.filter(Comment.topic == topic)
+    if sentiment:
+        query = query.filter(Comment.sentiment == sentiment)
+    if filename:
+        query = query.filter(CSVUpload.filename == filename)
+
+    total = query.count()
+    rows = query.order_by(CSVUpload.upload_id, Comment.ordinal).offset((page - 1) * per_page).limit(per_page).all()
+
+    return {
+        "comments": [
+            {
+                "filename": row_filename,
+                "text": text,
+                "sentiment": row_sentiment or "Unknown",
+                "topic": row_topic or "Unknown"
+            }
+            for row_filename, text, row_sentiment, row_topic in rows
+        ],
+        "page": page,
+        "per_page": per_page,
+        "total": total
+    }
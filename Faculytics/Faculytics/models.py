@@ -3,6 +3,7 @@ from enum import unique
 from . import db
 from sqlalchemy.dialects.postgresql import JSON
 from datetime import datetime
+import json
 import pytz
 
 # Association table for the many-to-many relationship between Campus and College.
@@ -166,10 +167,10 @@ class CSVUpload(db.Model):
     
     upload_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
     filename = db.Column(db.String(150), nullable=False)
-    comments1 = db.Column(db.JSON, nullable=False)  # Stores original comments
+    comments1 = db.Column(db.JSON, nullable=True)  # Legacy chunk, new uploads use the Comments table
     comments2 = db.Column(db.JSON, nullable=True)  # Stores original comments
     comments3 = db.Column(db.JSON, nullable=True)  # Stores original comments
-    sentiment1 = db.Column(db.JSON, nullable=False)  # Stores sentiment results
+    sentiment1 = db.Column(db.JSON, nullable=True)  # Legacy chunk, new uploads use the Comments table
     sentiment2 = db.Column(db.JSON, nullable=True)  # Stores sentiment results
     sentiment3 = db.Column(db.JSON, nullable=True)  # Stores sentiment results
     topics1 = db.Column(db.JSON, nullable=True)  # Stores topic modeling results
@@ -183,6 +184,87 @@ class CSVUpload(db.Model):
 
     # Relationships
     user = db.relationship('User', back_populates='uploads')
+    comment_rows = db.relationship(
+        'Comment',
+        back_populates='upload',
+        order_by='Comment.ordinal',
+        cascade="all, delete-orphan",
+        passive_deletes=True
+    )
+
+    # Legacy chunk columns holding each kind of data, in read order
+    CHUNK_COLUMNS = {
+        "comments": ("comments1", "comments2", "comments3"),
+        "sentiment": ("sentiment1", "sentiment2", "sentiment3"),
+        "topics": ("topics1", "topics2", "topics3")
+    }
+
+    def _decoded_chunks(self, kind):
+        """ Yields each non-empty chunk column of one kind as a decoded list """
+        for column in self.CHUNK_COLUMNS[kind]:
+            chunk = getattr(self, column)
+            if chunk is None:
+                continue
+            if isinstance(chunk, str):
+                try:
+                    chunk = json.loads(chunk)
+                except json.JSONDecodeError:
+                    continue
+            if isinstance(chunk, list):
+                yield chunk
+            elif isinstance(chunk, dict):
+                yield [chunk]
+
+    def iter_chunks(self, kind):
+        """ Lazily yields the decoded items stored across the chunk columns of one kind """
+        for chunk in self._decoded_chunks(kind):
+            yield from chunk
+
+    def chunk_items(self, kind):
+        """ All decoded items of one kind, e.g. upload.chunk_items('topics') """
+        items = []
+        for chunk in self._decoded_chunks(kind):
+            items.extend(chunk)
+        return items
 
     def __repr__(self):
         return f'<CSVUpload {self.filename}>'
+
+class Comment(db.Model):
+    __tablename__ = 'Comments'
+
+    comment_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    upload_id = db.Column(
+        db.BigInteger,
+        db.ForeignKey('Uploads.upload_id', ondelete='CASCADE'),
+        nullable=False
+    )
+    ordinal = db.Column(db.Integer, nullable=False)  # Row position in the uploaded CSV
+    text = db.Column(db.Text, nullable=False)
+    sentiment = db.Column(db.String(20), nullable=True)
+    probability = db.Column(db.Float, nullable=True)  # Confidence of the predicted sentiment
+    topic = db.Column(db.String(100), nullable=True)
+    topic_probability = db.Column(db.Float, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('upload_id', 'ordinal', name='comment_upload_ordinal_unique'),
+        db.Index('ix_comments_upload_topic_sentiment', 'upload_id', 'topic', 'sentiment'),
+    )
+
+    # Relationships
+    upload = db.relationship('CSVUpload', back_populates='comment_rows')
+
+    def __repr__(self):
+        return f'<Comment {self.upload_id}:{self.ordinal}>'
+
+class RecommendationCache(db.Model):
+    __tablename__ = 'RecommendationCache'
+
+    scope = db.Column(db.String(120), primary_key=True)  # e.g. teacher:<uName>
+    fingerprint = db.Column(db.String(64), nullable=False)  # Uploads and prompt version it was generated from
+    recommendation = db.Column(db.Text, nullable=False)
+    is_stale = db.Column(db.Boolean, default=False)  # Set when an upload of the scope is added or removed
+    generated_at = db.Column(db.DateTime, default=lambda: datetime.now(PH_TZ))
+
+    def __repr__(self):
+        return f'<RecommendationCache {self.scope}>'
@@ -0,0 +1,83 @@
+# recommendations.py
+import hashlib
+import os
+import threading
+import traceback
+from datetime import datetime
+from . import app, db
+from .models import RecommendationCache, PH_TZ
+
+# Bump when the analytics prompt changes so cached recommendations are regenerated
+ANALYTICS_PROMPT_VERSION = "analytics-v1"
+# Serve the last recommendation at once when the uploads changed and regenerate it in the background
+RECOMMENDATION_STALE_WHILE_REVALIDATE = os.getenv("RECOMMENDATION_STALE_WHILE_REVALIDATE", "1") == "1"
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+def teacher_scope(teacher_uname):
+    return f"teacher:{teacher_uname}"
+
+def uploads_fingerprint(file_counts, prompt_version=ANALYTICS_PROMPT_VERSION):
+    """ Hash of the (upload_id, comment count) pairs a recommendation was generated from """
+    parts = [prompt_version] + [f"{upload_id}:{count}" for upload_id, count in sorted(file_counts)]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+def _store(scope, fingerprint, recommendation):
+    row = RecommendationCache.query.get(scope)
+    if row is None:
+        row = RecommendationCache(scope=scope)
+        db.session.add(row)
+    row.fingerprint = fingerprint
+    row.recommendation = recommendation
+    row.is_stale = False
+    row.generated_at = datetime.now(PH_TZ)
+    db.session.commit()
+
+def _refresh(scope, fingerprint, generate):
+    """ Regenerate one scope on a background thread, one refresh per scope at a time """
+    with _refreshing_lock:
+        if scope in _refreshing:
+            return
+        _refreshing.add(scope)
+
+    def run():
+        try:
+            recommendation = generate()
+            if recommendation:
+                with app.app_context():
+                    _store(scope, fingerprint, recommendation)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(scope)
+
+    threading.Thread(target=run, name=f"recommendation-refresh-{scope}", daemon=True).start()
+
+def cached_recommendation(scope, fingerprint, generate, stale_while_revalidate=RECOMMENDATION_STALE_WHILE_REVALIDATE):
+    """
+    (recommendation, status) for a scope, calling generate() only when needed.
+
+    status is "hit" when the stored recommendation matches fingerprint, "stale"
+    when the last recommendation is served while a background refresh runs, and
+    "miss" when generate() ran in the request. generate returns None on failure,
+    which is never stored, so the next view retries.
+    """
+    row = RecommendationCache.query.get(scope)
+    if row is not None and row.fingerprint == fingerprint and not row.is_stale:
+        return row.recommendation, "hit"
+
+    if row is not None and stale_while_revalidate:
+        _refresh(scope, fingerprint, generate)
+        return row.recommendation, "stale"
+
+    recommendation = generate()
+    if recommendation:
+        _store(scope, fingerprint, recommendation)
+    return recommendation, "miss"
+
+def invalidate_recommendation(scope):
+    """ Mark a scope's recommendation stale, e.g. after one of its uploads was saved or deleted """
+    RecommendationCache.query.filter_by(scope=scope).update({"is_stale": True})
+    db.session.commit()
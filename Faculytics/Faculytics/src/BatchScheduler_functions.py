@@ -0,0 +1,125 @@
+import os
+import queue
+import threading
+import time
+import traceback
+from .StageGraph_functions import set_thread_budget
+
+# Comments per forward pass and how long the first queued comment may wait for others to join it
+DEFAULT_MAX_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", 32))
+DEFAULT_MAX_WAIT_MS = float(os.getenv("SENTIMENT_BATCH_MAX_WAIT_MS", 10))
+# Route SentimentAnalyzer forward passes through a BatchScheduler, set to 0 to run them per request
+SENTIMENT_BATCHING = os.getenv("SENTIMENT_BATCHING", "1") == "1"
+
+class _Submission:
+    def __init__(self, size):
+        self.results = [None] * size
+        self.remaining = size
+        self.error = None
+        self.done = threading.Event()
+        if size == 0:
+            self.done.set()
+
+class BatchScheduler:
+    """
+    Cross-request dynamic batching.
+
+    Items submitted by concurrent callers share one queue. A worker thread takes
+    the oldest item and keeps adding queued items until the batch holds
+    max_batch_size items or max_wait_ms has passed since the first one, runs
+    run_batch(items) -> results once, and hands every caller its own results.
+    A large submission fills batches immediately; small concurrent ones wait at
+    most max_wait_ms to be combined. threads caps PyTorch intra-op threads on the
+    worker thread, since the forward passes run there rather than on the callers.
+    """
+    def __init__(self, run_batch, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS, name="batch-scheduler", threads=None):
+        self.run_batch = run_batch
+        self.threads = threads
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {"batches": 0, "items": 0, "full_batches": 0, "queue_wait": 0.0, "run_seconds": 0.0}
+
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, items):
+        """ Queue items and block until all their results are ready; results keep the input order """
+        submission = _Submission(len(items))
+        now = time.perf_counter()
+        for position, item in enumerate(items):
+            self._queue.put((submission, position, item, now))
+        submission.done.wait()
+        if submission.error:
+            raise submission.error
+        return submission.results
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                # Whatever is already queued joins without waiting
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        set_thread_budget(self.threads)
+        self._serve()
+
+    def _serve(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                results = self.run_batch([item for _, _, item, _ in batch])
+                error = None
+            except Exception as e:
+                traceback.print_exc()
+                results, error = [None] * len(batch), e
+            finished = time.perf_counter()
+
+            for (submission, position, _, _), result in zip(batch, results):
+                if error:
+                    submission.error = error
+                submission.results[position] = result
+                submission.remaining -= 1
+                if submission.remaining == 0:
+                    submission.done.set()
+
+            with self._stats_lock:
+                self._stats["batches"] += 1
+                self._stats["items"] += len(batch)
+                self._stats["full_batches"] += len(batch) == self.max_batch_size
+                self._stats["queue_wait"] += sum(started - queued for _, _, _, queued in batch)
+                self._stats["run_seconds"] += finished - started
+
+    def stats(self):
+        """ Batch fill ratio and latency figures since startup, for tuning the two knobs """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches, items = stats["batches"], stats["items"]
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": batches,
+            "items": items,
+            "avg_batch_size": items / batches if batches else 0.0,
+            "fill_ratio": items / (batches * self.max_batch_size) if batches else 0.0,
+            "full_batch_ratio": stats["full_batches"] / batches if batches else 0.0,
+            "avg_queue_wait_ms": stats["queue_wait"] / items * 1000 if items else 0.0,
+            "avg_batch_ms": stats["run_seconds"] / batches * 1000 if batches else 0.0,
+            "queued": self._queue.qsize()
+        }
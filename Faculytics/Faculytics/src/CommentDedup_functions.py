@@ -0,0 +1,54 @@
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r"\s+")
+# Trailing/leading punctuation and symbols that do not change what a comment says ("Very good!!" vs "very good")
+_EDGE_PUNCTUATION = " .,!?;:'\"-_~*()[]"
+
+def dedup_key(text):
+    """ Key under which comments count as duplicates: NFKC, case-folded, single-spaced, no edge punctuation """
+    text = unicodedata.normalize("NFKC", str(text)).casefold()
+    return _WHITESPACE.sub(" ", text).strip(_EDGE_PUNCTUATION)
+
+class CommentDedup:
+    """
+    Rows of comments grouped by normalized text.
+
+    unique holds the first original comment of each group, which is what the
+    models see, and scatter() maps one result per unique comment back to every
+    row. Evaluation CSVs repeat short answers like "none" or "very good" many
+    times, so models run once per group instead of once per row.
+    """
+    def __init__(self, texts, key=dedup_key):
+        self.rows = len(texts)
+        self.first = []
+        self.inverse = []
+        self.keys = {}
+        for row, text in enumerate(texts):
+            group = self.keys.setdefault(key(text), len(self.first))
+            if group == len(self.first):
+                self.first.append(row)
+            self.inverse.append(group)
+        self.unique = [texts[row] for row in self.first]
+
+    def take(self, values):
+        """ The values of the first row of each group, e.g. cleaned comments aligned with unique """
+        if hasattr(values, "iloc"):
+            return values.iloc[self.first]
+        if hasattr(values, "shape"):
+            return values[self.first]
+        return [values[row] for row in self.first]
+
+    def scatter(self, values):
+        """ One value per unique comment -> one value per row; numpy arrays stay arrays """
+        if hasattr(values, "shape"):
+            return values[self.inverse]
+        return [values[group] for group in self.inverse]
+
+    @property
+    def ratio(self):
+        """ Share of rows answered by another row's inference """
+        return 1 - len(self.first) / self.rows if self.rows else 0.0
+
+    def stats(self):
+        return {"rows": self.rows, "unique": len(self.first), "ratio": round(self.ratio, 4)}
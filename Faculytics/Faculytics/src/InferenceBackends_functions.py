@@ -0,0 +1,177 @@
+from types import SimpleNamespace
+import json
+import os
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# "fp32" is plain PyTorch, "int8" applies dynamic quantization to every Linear layer,
+# "onnx" runs graphs exported with `flask export-onnx` in ONNX Runtime. int8 and onnx run on CPU.
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "fp32")
+INFERENCE_BACKENDS = ("fp32", "int8", "onnx")
+DEFAULT_ONNX_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(current_dir, "..", "ml_models", "onnx"))
+ONNX_OPSET = 17
+# Models that can be exported, named as in model_manifest.json
+ONNX_MODELS = ("sentiment", "embedding")
+
+EXPORT_FILE = "export.json"
+ONNX_FILE = "model.onnx"
+
+def check_backend(backend):
+    """ Canonical backend name: None falls back to INFERENCE_BACKEND, case and spaces are ignored """
+    name = (backend or INFERENCE_BACKEND).strip().lower()
+    if name not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    return name
+
+def cache_suffix(backend):
+    """ Appended to inference cache model keys, since int8/onnx outputs differ slightly from fp32 """
+    return "" if backend == "fp32" else f"+{backend}"
+
+def onnx_model_dir(name, directory=DEFAULT_ONNX_DIR):
+    return os.path.join(os.path.abspath(directory), name)
+
+def quantize_int8(module):
+    """ Dynamic int8 quantization of the module's Linear layers, in place, on CPU """
+    import torch
+    module.to("cpu")
+    return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def _onnx_session(directory):
+    try:
+        import onnxruntime
+    except ImportError:
+        raise RuntimeError("INFERENCE_BACKEND=onnx needs the onnxruntime package")
+    path = os.path.join(directory, ONNX_FILE)
+    if not os.path.isfile(path):
+        raise RuntimeError(f"No exported model at {path}, run `flask export-onnx` first")
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+class OnnxSequenceClassifier:
+    """ Stands in for the Hugging Face model inside SentimentAnalyzer: model(**inputs).logits """
+    def __init__(self, directory):
+        from transformers import AutoConfig
+        self.config = AutoConfig.from_pretrained(directory)
+        self.session = _onnx_session(directory)
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def __call__(self, **inputs):
+        import torch
+        feed = {name: inputs[name].cpu().numpy() for name in self.input_names}
+        logits = self.session.run(["logits"], feed)[0]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+class OnnxSentenceEncoder:
+    """ Stands in for SentenceTransformer.encode with an exported transformer plus mean pooling """
+    def __init__(self, directory, batch_size=32):
+        from transformers import AutoTokenizer
+        with open(os.path.join(directory, EXPORT_FILE), "r", encoding="utf-8") as f:
+            self.info = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        self.session = _onnx_session(directory)
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        self.batch_size = batch_size
+
+    def get_sentence_embedding_dimension(self):
+        return self.info["dimension"]
+
+    def encode(self, sentences, batch_size=None, convert_to_tensor=False, normalize_embeddings=False, **kwargs):
+        import numpy as np
+
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        batch_size = batch_size or self.batch_size
+
+        embeddings = np.zeros((len(sentences), self.info["dimension"]), dtype=np.float32)
+        # Longest first, like SentenceTransformer, so each batch pads to similar lengths
+        order = np.argsort([-len(sentence) for sentence in sentences])
+        for start in range(0, len(order), batch_size):
+            batch_idx = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [sentences[i] for i in batch_idx],
+                padding=True,
+                truncation=True,
+                max_length=self.info["max_seq_length"],
+                return_tensors="np"
+            )
+            feed = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(["last_hidden_state"], feed)[0]
+
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            embeddings[batch_idx] = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+        if self.info["normalize"] or normalize_embeddings:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        if convert_to_tensor:
+            import torch
+            embeddings = torch.from_numpy(embeddings)
+        return embeddings[0] if single else embeddings
+
+def _export(model, tokenizer, directory, output_name, info):
+    import torch
+
+    os.makedirs(directory, exist_ok=True)
+    sample = tokenizer(["The teacher explains the lessons clearly."], return_tensors="pt")
+    # Positional order of the forward() signatures of BERT and DistilBERT
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    if "distilbert" in model.config.model_type:
+        input_names = [name for name in input_names if name != "token_type_ids"]
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes[output_name] = {0: "batch"} if output_name == "logits" else {0: "batch", 1: "sequence"}
+
+    model.config.return_dict = False
+    model.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            os.path.join(directory, ONNX_FILE),
+            input_names=input_names,
+            output_names=[output_name],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET
+        )
+    model.config.return_dict = True
+
+    model.config.save_pretrained(directory)
+    tokenizer.save_pretrained(directory)
+    info = dict(info, inputs=input_names, opset=ONNX_OPSET, torch=torch.__version__)
+    with open(os.path.join(directory, EXPORT_FILE), "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    return directory
+
+def export_onnx_model(name, source, revision=None, directory=DEFAULT_ONNX_DIR, token=None):
+    """ Export one model from ONNX_MODELS, loaded from source (Hub id or local snapshot). Returns its directory """
+    target = onnx_model_dir(name, directory)
+    info = {"name": name, "source": source, "revision": revision}
+
+    if name == "sentiment":
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+        model = AutoModelForSequenceClassification.from_pretrained(source, revision=revision, token=token)
+        tokenizer = AutoTokenizer.from_pretrained(source, revision=revision, token=token)
+        return _export(model, tokenizer, target, "logits", info)
+
+    if name == "embedding":
+        from sentence_transformers import SentenceTransformer
+        from sentence_transformers.models import Normalize, Pooling
+        encoder = SentenceTransformer(source, revision=revision, device="cpu")
+        pooling = next(module for module in encoder if isinstance(module, Pooling))
+        if not pooling.pooling_mode_mean_tokens:
+            raise ValueError(f"{source} does not use mean pooling, which is all OnnxSentenceEncoder implements")
+        info.update({
+            "max_seq_length": encoder.max_seq_length,
+            "dimension": encoder.get_sentence_embedding_dimension(),
+            "normalize": any(isinstance(module, Normalize) for module in encoder)
+        })
+        return _export(encoder[0].auto_model, encoder[0].tokenizer, target, "last_hidden_state", info)
+
+    raise ValueError(f"Cannot export {name}, expected one of {', '.join(ONNX_MODELS)}")
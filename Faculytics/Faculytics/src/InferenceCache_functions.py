@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.getenv(
+    "INFERENCE_CACHE_PATH",
+    os.path.join(current_dir, "..", "cache", "inference_cache.sqlite3")
+)
+
+def normalize_comment(text):
+    """ Canonical form of a comment used for cache keys (unicode + whitespace) """
+    return " ".join(unicodedata.normalize("NFC", str(text)).split())
+
+class InferenceCache:
+    """
+    Content-addressed store of per-comment model outputs.
+
+    Rows are keyed by sha256(kind, model id/revision, normalized text) so the
+    same comment is only ever run once per model, no matter which upload it
+    came from. Embeddings are stored as raw float32 bytes, everything else as JSON.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS inference_cache (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                value BLOB NOT NULL,
+                created REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+        self.hits = {}
+        self.misses = {}
+
+    @staticmethod
+    def make_key(kind, model, text):
+        payload = f"{kind}\x00{model}\x00{normalize_comment(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _encode(kind, value):
+        if kind == "embedding":
+            return np.asarray(value, dtype=np.float32).tobytes()
+        return json.dumps(value).encode("utf-8")
+
+    @staticmethod
+    def _decode(kind, blob):
+        if kind == "embedding":
+            return np.frombuffer(blob, dtype=np.float32)
+        return json.loads(blob.decode("utf-8"))
+
+    def get_many(self, kind, model, texts):
+        """ Returns {index: value} for every text already in the cache """
+        keys = [self.make_key(kind, model, text) for text in texts]
+        found = {}
+        with self._lock:
+            unique_keys = list(set(keys))
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                part = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM inference_cache WHERE key IN ({placeholders})", part
+                ).fetchall()
+                found.update(rows)
+
+            results = {i: self._decode(kind, found[key]) for i, key in enumerate(keys) if key in found}
+            self.hits[kind] = self.hits.get(kind, 0) + len(results)
+            self.misses[kind] = self.misses.get(kind, 0) + len(keys) - len(results)
+        return results
+
+    def put_many(self, kind, model, items):
+        """ Store (text, value) pairs, overwriting older entries for the same key """
+        now = time.time()
+        rows = [
+            (self.make_key(kind, model, text), kind, model, self._encode(kind, value), now)
+            for text, value in items
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO inference_cache (key, kind, model, value, created) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def stats(self):
+        """ Hit rate for this process plus entry count and stored bytes per kind """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM inference_cache GROUP BY kind"
+            ).fetchall()
+
+        by_kind = {}
+        for kind in set(self.hits) | set(self.misses) | {row[0] for row in rows}:
+            hits = self.hits.get(kind, 0)
+            misses = self.misses.get(kind, 0)
+            by_kind[kind] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if (hits + misses) > 0 else 0.0,
+                "entries": 0,
+                "bytes": 0
+            }
+        for kind, entries, size in rows:
+            by_kind[kind]["entries"] = entries
+            by_kind[kind]["bytes"] = size
+
+        total_hits = sum(self.hits.values())
+        total_misses = sum(self.misses.values())
+        return {
+            "path": self.path,
+            "hits": total_hits,
+            "misses": total_misses,
+            "hit_rate": total_hits / (total_hits + total_misses) if (total_hits + total_misses) > 0 else 0.0,
+            "entries": sum(item["entries"] for item in by_kind.values()),
+            "bytes": sum(item["bytes"] for item in by_kind.values()),
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "by_kind": by_kind
+        }
@@ -0,0 +1,309 @@
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import hashlib
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import traceback
+
+# Where the inference server listens and the web workers connect, e.g.
+# unix:///tmp/faculytics-inference.sock or http://127.0.0.1:8765. Empty keeps models in-process.
+INFERENCE_SERVER_URL = os.getenv("INFERENCE_SERVER_URL", "")
+# Seconds a web worker waits for one inference call; uploads of 1500 comments run well under this
+INFERENCE_SERVER_TIMEOUT = float(os.getenv("INFERENCE_SERVER_TIMEOUT", 600))
+
+def _json_default(value):
+    # numpy scalars and arrays coming out of the models
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+class RequestCoalescer:
+    """
+    Runs run_batch on one worker thread over every request queued since its previous call.
+
+    Requests that arrive while the model is busy are merged into the next call, so
+    concurrent uploads share forward passes instead of queuing one by one.
+    run_batch takes a list of payloads and returns one result per payload.
+    """
+    def __init__(self, run_batch, name="coalescer"):
+        self.run_batch = run_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, payload):
+        future = Future()
+        self._queue.put((payload, future))
+        return future.result()
+
+    def _loop(self):
+        while True:
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                results = self.run_batch([payload for payload, _ in items])
+                for (_, future), result in zip(items, results):
+                    future.set_result(result)
+            except Exception as e:
+                traceback.print_exc()
+                for _, future in items:
+                    future.set_exception(e)
+
+def predict_sentiment_batch(analyzer, requests):
+    """
+    One SentimentAnalyzer.predict per output spec over the unique texts of several
+    (texts, output) requests, split back per request.
+    """
+    results = [None] * len(requests)
+    by_output = {}
+    for idx, (_, output) in enumerate(requests):
+        by_output.setdefault(output, []).append(idx)
+
+    for output, indices in by_output.items():
+        positions = {}
+        for idx in indices:
+            for text in requests[idx][0]:
+                positions.setdefault(text, len(positions))
+        merged = analyzer.predict(list(positions), output=output)
+        for idx in indices:
+            texts = requests[idx][0]
+            results[idx] = {key: [values[positions[text]] for text in texts] for key, values in merged.items()}
+    return results
+
+class SingleFlight:
+    """ Identical concurrent calls wait for the first one instead of recomputing """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def run(self, key, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return future.result()
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class InferenceServer:
+    """
+    Owns the sentiment and topic models for every web worker on the machine.
+
+    Serves JSON over local HTTP or a Unix socket:
+      POST /sentiment      {"texts": [...], "output": spec} -> SentimentAnalyzer.predict output
+      POST /topics         {"comments": [...]}  -> process_comments output and topic model version
+      POST /topics/refit   {"comments": [...]}  -> new corpus topic model version
+      GET  /health                              -> model registry status
+      GET  /stats                               -> sentiment batching metrics
+    Concurrent sentiment requests share forward passes, through the analyzer's
+    BatchScheduler or, with batching off, by coalescing whole requests; identical
+    topic requests in flight are computed once.
+    """
+    def __init__(self, registry, url=INFERENCE_SERVER_URL):
+        import pandas as pd
+        self._pd = pd
+
+        self.registry = registry
+        self.url = url
+        self.sentiment = RequestCoalescer(
+            lambda requests: predict_sentiment_batch(self.registry.get("sentiment"), requests),
+            name="sentiment-coalescer"
+        )
+        self.topics = SingleFlight()
+
+    def handle(self, method, path, payload):
+        if method == "GET" and path == "/health":
+            return {"ready": self.registry.is_ready(), "models": self.registry.status()}
+        if method == "GET" and path == "/stats":
+            return {"sentiment_batching": self.batching_stats()}
+        if method == "POST" and path == "/sentiment":
+            texts = [str(text) for text in payload["texts"]]
+            output = payload.get("output", "full")
+            analyzer = self.registry.get("sentiment")
+            if getattr(analyzer, "scheduler", None):
+                # The analyzer batches comments across request threads itself
+                return analyzer.predict(texts, output=output)
+            return self.sentiment.submit((texts, output))
+        if method == "POST" and path == "/topics":
+            comments = [str(comment) for comment in payload["comments"]]
+            key = hashlib.sha256(json.dumps(comments).encode("utf-8")).hexdigest()
+            return self.topics.run(key, lambda: self._process_comments(comments))
+        if method == "POST" and path == "/topics/refit":
+            return {"version": self.registry.get("topics").fit_corpus_model(payload["comments"])}
+        return None
+
+    def batching_stats(self):
+        analyzer = self.registry.peek("sentiment")
+        scheduler = getattr(analyzer, "scheduler", None)
+        return scheduler.stats() if scheduler else None
+
+    def _process_comments(self, comments):
+        processor = self.registry.get("topics")
+        records, top_words, category_counts, version = processor.process_comments(self._pd.DataFrame({"comment": comments}))
+        return {
+            "records": records,
+            "top_words": top_words,
+            "category_counts": category_counts,
+            "topic_model_version": version
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, status, body):
+                data = json.dumps(body, default=_json_default).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _dispatch(self, method):
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    payload = json.loads(self.rfile.read(length)) if length else {}
+                    result = server.handle(method, self.path, payload)
+                    if result is None:
+                        self._respond(404, {"error": f"Unknown endpoint {method} {self.path}"})
+                    else:
+                        self._respond(200, result)
+                except (KeyError, ValueError) as e:
+                    self._respond(400, {"error": str(e)})
+                except Exception as e:
+                    traceback.print_exc()
+                    self._respond(500, {"error": str(e)})
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def address_string(self):
+                # Unix socket peers have no address
+                return self.client_address[0] if self.client_address else "unix"
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def serve_forever(self):
+        target = urlparse(self.url)
+        if target.scheme == "unix":
+            if os.path.exists(target.path):
+                os.remove(target.path)
+            httpd = ThreadingUnixHTTPServer(target.path, self._handler_class())
+        elif target.scheme == "http":
+            httpd = ThreadingHTTPServer((target.hostname, target.port or 80), self._handler_class())
+        else:
+            raise ValueError(f"Unsupported inference server URL: {self.url}")
+        print(f"Inference server listening on {self.url}")
+        httpd.serve_forever()
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+class InferenceClient:
+    """ Thin JSON client for InferenceServer, one connection per call """
+    def __init__(self, url=INFERENCE_SERVER_URL, timeout=INFERENCE_SERVER_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self._target = urlparse(url)
+        if self._target.scheme not in ("unix", "http"):
+            raise ValueError(f"Unsupported inference server URL: {url}")
+
+    def _connection(self):
+        if self._target.scheme == "unix":
+            return UnixHTTPConnection(self._target.path, self.timeout)
+        return http.client.HTTPConnection(self._target.hostname, self._target.port or 80, timeout=self.timeout)
+
+    def _request(self, method, path, payload=None):
+        connection = self._connection()
+        try:
+            body = json.dumps(payload) if payload is not None else None
+            connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            data = json.loads(response.read() or b"{}")
+        finally:
+            connection.close()
+        if response.status == 400:
+            raise ValueError(data.get("error", "Bad inference request"))
+        if response.status != 200:
+            raise RuntimeError(f"Inference server error ({response.status}): {data.get('error')}")
+        return data
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def stats(self):
+        return self._request("GET", "/stats")
+
+    def predict_sentiment(self, texts, output="full"):
+        return self._request("POST", "/sentiment", {"texts": [str(text) for text in texts], "output": output})
+
+    def process_comments(self, comments):
+        return self._request("POST", "/topics", {"comments": [str(comment) for comment in comments]})
+
+    def fit_corpus_model(self, comments):
+        return self._request("POST", "/topics/refit", {"comments": list(comments)})["version"]
+
+class RemoteSentimentAnalyzer:
+    """ SentimentAnalyzer stand-in that forwards predict() to the inference server """
+    def __init__(self, client):
+        self.client = client
+
+    def predict(self, texts, batch_size=None, output="full", as_numpy=False):
+        result = self.client.predict_sentiment(texts, output)
+        if as_numpy:
+            import numpy as np
+            result = {key: values if key == "predictions" else np.asarray(values) for key, values in result.items()}
+        return result
+
+class RemoteCommentProcessor:
+    """ CommentProcessor stand-in that forwards process_comments() to the inference server """
+    topic_model_mode = "remote"
+    # The inference server decides per call; each result carries the version it used
+    uses_corpus_model = None
+
+    def __init__(self, client):
+        self.client = client
+
+    def process_comments(self, df):
+        result = self.client.process_comments(df["comment"].tolist())
+        top_words = [tuple(item) for item in result["top_words"]]
+        return result["records"], top_words, result["category_counts"], result["topic_model_version"]
+
+    def fit_corpus_model(self, comments):
+        return self.client.fit_corpus_model(comments)
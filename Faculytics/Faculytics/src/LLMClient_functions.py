@@ -0,0 +1,232 @@
+import hashlib
+import os
+import random
+import threading
+import time
+
+# "gemini" calls the Gemini API, "stub" returns deterministic text offline for load tests
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+LLM_BACKENDS = ("gemini", "stub")
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash")
+# Deadline of one generate() call, retries and waiting for a free slot included
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 60))
+# Calls in flight at once across the process; more wait for a slot until their deadline
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", 1.0))
+# Consecutive failed calls that open the circuit, and how long it stays open
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", 60))
+# Simulated latency of the stub backend
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", 0))
+
+class LLMUnavailable(RuntimeError):
+    """ generate() gave up: circuit open, deadline passed or retries exhausted """
+
+class GeminiBackend:
+    def __init__(self, api_key=None, model=LLM_MODEL, timeout=LLM_TIMEOUT_SECONDS):
+        from google import genai
+        from google.genai import types
+        self._types = types
+        self.model = model
+        self.timeout = timeout
+        self.client = genai.Client(api_key=api_key or os.getenv("GOOGLE_API_KEY"))
+
+    def generate(self, prompt, system_instruction=None, temperature=0.4, timeout=None):
+        """ (text, {"prompt_tokens": n, "completion_tokens": n}); timeout bounds this one HTTP request """
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=self._types.GenerateContentConfig(
+                system_instruction=system_instruction,
+                temperature=temperature,
+                http_options=self._types.HttpOptions(timeout=max(1, int((timeout or self.timeout) * 1000)))
+            )
+        )
+        usage = getattr(response, "usage_metadata", None)
+        return response.text.strip(), {
+            "prompt_tokens": getattr(usage, "prompt_token_count", None) or 0,
+            "completion_tokens": getattr(usage, "candidates_token_count", None) or 0
+        }
+
+class StubBackend:
+    """ Deterministic offline stand-in: the same prompt always gets the same numbered recommendations """
+    model = "stub"
+
+    def __init__(self, latency_ms=LLM_STUB_LATENCY_MS):
+        self.latency = latency_ms / 1000
+
+    def generate(self, prompt, system_instruction=None, temperature=0.4, timeout=None):
+        if self.latency:
+            time.sleep(self.latency if timeout is None else min(self.latency, timeout))
+            if timeout is not None and self.latency > timeout:
+                raise TimeoutError("Stub backend latency exceeds the request timeout")
+        digest = hashlib.sha256(f"{system_instruction}|{prompt}".encode("utf-8")).hexdigest()
+        text = "\n".join(f"{i}. Recommendation {digest[i * 8:(i + 1) * 8]}." for i in range(1, 4))
+        return text, {"prompt_tokens": len(prompt.split()), "completion_tokens": len(text.split())}
+
+def build_backend(name=LLM_BACKEND):
+    if name == "gemini":
+        return GeminiBackend()
+    if name == "stub":
+        return StubBackend()
+    raise ValueError(f"Unknown LLM backend: {name}, expected one of {', '.join(LLM_BACKENDS)}")
+
+def is_retryable(error):
+    """ Rate limits, server errors and transport failures are retried; other client errors are not """
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and 400 <= code < 500:
+        return code in (408, 429)
+    return not isinstance(error, (ValueError, TypeError))
+
+class CircuitBreaker:
+    """
+    Fails calls fast after `failures` consecutive failures, for reset_seconds.
+    After that one trial call is let through (half-open); its outcome closes or
+    re-opens the circuit.
+    """
+    def __init__(self, failures=LLM_BREAKER_FAILURES, reset_seconds=LLM_BREAKER_RESET_SECONDS):
+        self.failures = max(1, failures)
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self._opened_at >= self.reset_seconds else "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._trial or self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+class LLMClient:
+    """
+    Recommendation calls with a deadline, a concurrency cap, exponential backoff
+    with jitter and a circuit breaker around a backend (GeminiBackend or StubBackend).
+
+    generate() returns the text or raises LLMUnavailable; stats() reports call
+    outcomes, latency and token usage since startup, plus the estimated size of
+    the prompts built by PromptBuilder when generate() is given their report.
+    """
+    def __init__(self, backend, max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TIMEOUT_SECONDS,
+                 max_retries=LLM_MAX_RETRIES, backoff=LLM_BACKOFF_SECONDS, breaker=None):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self.max_concurrency = max(1, max_concurrency)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "calls": 0, "succeeded": 0, "failed": 0, "rejected": 0, "retries": 0,
+            "latency_seconds": 0.0, "max_latency_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+            "reported_prompts": 0, "estimated_prompt_tokens": 0, "max_estimated_prompt_tokens": 0, "examples_dropped": 0
+        }
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for key, value in increments.items():
+                self._stats[key] += value
+
+    def generate(self, prompt, system_instruction=None, temperature=0.4, timeout=None, report=None):
+        deadline = time.monotonic() + (timeout or self.timeout)
+        self._count(calls=1)
+        if report:
+            with self._stats_lock:
+                self._stats["reported_prompts"] += 1
+                self._stats["estimated_prompt_tokens"] += report["estimated_tokens"]
+                self._stats["max_estimated_prompt_tokens"] = max(self._stats["max_estimated_prompt_tokens"], report["estimated_tokens"])
+                self._stats["examples_dropped"] += report.get("examples_dropped", 0)
+
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self._count(rejected=1)
+            raise LLMUnavailable("No free LLM slot before the deadline")
+        # Checked once a slot is held, so a half-open trial call always runs
+        if not self.breaker.allow():
+            self._slots.release()
+            self._count(rejected=1)
+            raise LLMUnavailable("LLM circuit breaker is open")
+
+        started = time.monotonic()
+        try:
+            return self._generate_with_retries(prompt, system_instruction, temperature, deadline)
+        finally:
+            self._slots.release()
+            latency = time.monotonic() - started
+            with self._stats_lock:
+                self._stats["latency_seconds"] += latency
+                self._stats["max_latency_seconds"] = max(self._stats["max_latency_seconds"], latency)
+
+    def _generate_with_retries(self, prompt, system_instruction, temperature, deadline):
+        attempt = 0
+        while True:
+            # Each attempt only gets what is left of the call deadline, waiting for the slot included
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.breaker.record_failure()
+                self._count(failed=1)
+                raise LLMUnavailable(f"LLM call deadline passed after {attempt} attempt(s)")
+            try:
+                text, usage = self.backend.generate(prompt, system_instruction=system_instruction, temperature=temperature, timeout=remaining)
+            except Exception as e:
+                delay = self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+                if not is_retryable(e) or attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                    self.breaker.record_failure()
+                    self._count(failed=1)
+                    raise LLMUnavailable(f"LLM call failed after {attempt + 1} attempt(s): {e}") from e
+                attempt += 1
+                self._count(retries=1)
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self._count(succeeded=1, prompt_tokens=usage["prompt_tokens"], completion_tokens=usage["completion_tokens"])
+            return text
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        finished = stats["succeeded"] + stats["failed"]
+        return {
+            "backend": type(self.backend).__name__,
+            "model": getattr(self.backend, "model", None),
+            "breaker": self.breaker.state,
+            "max_concurrency": self.max_concurrency,
+            "calls": stats["calls"],
+            "succeeded": stats["succeeded"],
+            "failed": stats["failed"],
+            "rejected": stats["rejected"],
+            "retries": stats["retries"],
+            "avg_latency_ms": stats["latency_seconds"] / finished * 1000 if finished else 0.0,
+            "max_latency_ms": stats["max_latency_seconds"] * 1000,
+            "prompt_tokens": stats["prompt_tokens"],
+            "completion_tokens": stats["completion_tokens"],
+            "avg_estimated_prompt_tokens": stats["estimated_prompt_tokens"] / stats["reported_prompts"] if stats["reported_prompts"] else 0.0,
+            "max_estimated_prompt_tokens": stats["max_estimated_prompt_tokens"],
+            "examples_dropped": stats["examples_dropped"]
+        }
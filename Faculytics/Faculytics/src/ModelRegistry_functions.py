@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+import traceback
+
+# Load every registered model in a background thread at startup, set to 0 to load on first use only
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+
+class ModelRegistry:
+    """
+    Lazily constructed models, keyed by name.
+
+    Factories run on the first get() (or in the warm-up thread), so importing
+    the app does not pay for torch/transformers/BERTopic and routes that never
+    touch a model start serving immediately. Factories should import their heavy
+    modules inside the function body for the same reason.
+    """
+    def __init__(self):
+        self._factories = {}
+        self._models = {}
+        self._locks = {}
+        self._status = {}
+        self._warmup_thread = None
+
+    def register(self, name, factory):
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+        self._status[name] = {"state": "not_loaded", "seconds": None, "error": None}
+
+    def get(self, name):
+        """ The model instance, built on first use; raises if its factory failed """
+        if name in self._models:
+            return self._models[name]
+
+        with self._locks[name]:
+            if name in self._models:
+                return self._models[name]
+
+            self._status[name] = {"state": "loading", "seconds": None, "error": None}
+            started = time.perf_counter()
+            try:
+                model = self._factories[name]()
+            except Exception as e:
+                self._status[name] = {"state": "failed", "seconds": round(time.perf_counter() - started, 3), "error": str(e)}
+                raise
+            self._models[name] = model
+            self._status[name] = {"state": "ready", "seconds": round(time.perf_counter() - started, 3), "error": None}
+            return model
+
+    def peek(self, name):
+        """ The model instance if already loaded, without triggering a load """
+        return self._models.get(name)
+
+    def is_ready(self, name=None):
+        names = [name] if name else list(self._factories)
+        return all(self._status[n]["state"] == "ready" for n in names)
+
+    def status(self):
+        return {name: dict(status) for name, status in self._status.items()}
+
+    def warm_up(self, names=None):
+        """ Load the given (default: all) models one after another on a daemon thread """
+        if self._warmup_thread is not None:
+            return self._warmup_thread
+        names = list(names or self._factories)
+
+        def load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    # Already recorded in status(), a later get() retries the load
+                    traceback.print_exc()
+
+        self._warmup_thread = threading.Thread(target=load_all, name="model-warmup", daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
@@ -0,0 +1,179 @@
+import glob
+import json
+import mmap
+import os
+import re
+import struct
+import warnings
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_STORE_DIR = os.getenv("MODEL_STORE_DIR", os.path.join(current_dir, "..", "ml_models"))
+DEFAULT_MANIFEST_PATH = os.getenv("MODEL_MANIFEST_PATH", os.path.join(current_dir, "model_manifest.json"))
+# Commit hashes resolved by `flask sync-models`, committed next to the manifest
+DEFAULT_LOCK_PATH = os.getenv("MODEL_LOCK_PATH", os.path.join(current_dir, "model_manifest.lock.json"))
+# Map safetensors weights into memory so worker processes share one page-cached copy
+MODEL_STORE_MMAP = os.getenv("MODEL_STORE_MMAP", "1") == "1"
+
+# Files fetched by sync: weights as safetensors only, plus configs, tokenizers and
+# the sentence-transformers module folders
+SYNC_PATTERNS = ["*.safetensors", "*.json", "*.txt", "*.model", "1_Pooling/*", "2_Normalize/*"]
+
+SNAPSHOT_FILE = "snapshot.json"
+
+COMMIT_PATTERN = re.compile(r"^[0-9a-f]{40}$")
+
+class ModelStore:
+    """
+    Local directory of pinned model snapshots: <directory>/<name>/<revision>/.
+
+    model_manifest.json maps each model name to a Hub repo_id and the revision to
+    track, a commit hash or a branch like "main". `flask sync-models` downloads
+    every entry once and records the commit it resolved to in
+    model_manifest.lock.json, which is committed alongside the manifest; later
+    syncs and loads use exactly the locked commit. The manifest itself is never
+    rewritten. Once synced, loading needs no network access.
+    """
+    def __init__(self, directory=DEFAULT_MODEL_STORE_DIR, manifest_path=DEFAULT_MANIFEST_PATH, use_mmap=MODEL_STORE_MMAP, lock_path=DEFAULT_LOCK_PATH):
+        self.directory = os.path.abspath(directory)
+        self.manifest_path = manifest_path
+        self.lock_path = lock_path
+        self.use_mmap = use_mmap
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        try:
+            with open(lock_path, "r", encoding="utf-8") as f:
+                self.lock = json.load(f)
+        except FileNotFoundError:
+            self.lock = {}
+
+    def entry(self, name):
+        """ Manifest entry of a model, with revision replaced by its locked commit when there is one """
+        if name not in self.manifest:
+            raise KeyError(f"Model {name} is not in {self.manifest_path}")
+        entry = dict(self.manifest[name])
+        locked = self.lock.get(name)
+        # A lock for another repo_id is stale: the manifest entry was changed since the last sync
+        if locked and locked["repo_id"] == entry["repo_id"]:
+            entry["revision"] = locked["revision"]
+        return entry
+
+    def is_pinned(self, name):
+        return bool(COMMIT_PATTERN.match(self.entry(name)["revision"]))
+
+    def snapshot_dir(self, name):
+        return os.path.join(self.directory, name, self.entry(name)["revision"])
+
+    def is_synced(self, name):
+        return os.path.isfile(os.path.join(self.snapshot_dir(name), SNAPSHOT_FILE))
+
+    def resolve(self, name):
+        """
+        (source, revision) to pass to from_pretrained and friends.
+
+        The local snapshot when synced; otherwise the Hub repo at the pinned
+        revision, which needs network access on first use.
+        """
+        if self.is_synced(name):
+            return self.snapshot_dir(name), None
+        entry = self.entry(name)
+        if not self.is_pinned(name):
+            warnings.warn(f"Model {name} follows {entry['revision']} of {entry['repo_id']}, run `flask sync-models` to pin it")
+        return entry["repo_id"], entry["revision"]
+
+    def sync(self, name):
+        """ Download one model into the store and lock its commit. Returns the snapshot dir """
+        from huggingface_hub import HfApi, snapshot_download
+
+        entry = self.entry(name)
+        commit = HfApi().model_info(entry["repo_id"], revision=entry["revision"], token=os.getenv("HF_TOKEN")).sha
+        target = os.path.join(self.directory, name, commit)
+
+        if not os.path.isfile(os.path.join(target, SNAPSHOT_FILE)):
+            snapshot_download(
+                entry["repo_id"],
+                revision=commit,
+                local_dir=target,
+                allow_patterns=SYNC_PATTERNS,
+                token=os.getenv("HF_TOKEN")
+            )
+            if not glob.glob(os.path.join(target, "*.safetensors")):
+                raise ValueError(f"{entry['repo_id']}@{commit} has no safetensors weights, convert the checkpoint first")
+            with open(os.path.join(target, SNAPSHOT_FILE), "w", encoding="utf-8") as f:
+                json.dump({"name": name, "repo_id": entry["repo_id"], "revision": commit}, f)
+
+        if self.lock.get(name) != {"repo_id": entry["repo_id"], "revision": commit}:
+            self.lock[name] = {"repo_id": entry["repo_id"], "revision": commit}
+            self._write_lock()
+        return target
+
+    def _write_lock(self):
+        tmp_path = f"{self.lock_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.lock, f, indent=2, sort_keys=True)
+            f.write("\n")
+        os.replace(tmp_path, self.lock_path)
+
+    def attach_weights(self, name, module):
+        """
+        Swap a loaded module's parameters for memory-mapped views of the snapshot's
+        safetensors files, releasing the private copy from_pretrained made.
+        Returns the number of tensors attached.
+        """
+        if not self.use_mmap or not self.is_synced(name):
+            return 0
+        return attach_mmap_weights(module, self.snapshot_dir(name))
+
+def mmap_safetensors(path):
+    """
+    {name: tensor} backed by a private (copy-on-write) mapping of a safetensors file.
+
+    Pages stay in the shared page cache until written, and inference never writes
+    to weights, so every process mapping the same file shares one copy.
+    """
+    import torch
+
+    dtypes = {
+        "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+        "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+        "U8": torch.uint8, "BOOL": torch.bool
+    }
+
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    header.pop("__metadata__", None)
+
+    # The tensor keeps the mapping alive
+    buffer = torch.frombuffer(mapped, dtype=torch.uint8)
+    data_start = 8 + header_size
+
+    tensors = {}
+    for key, info in header.items():
+        start, end = info["data_offsets"]
+        raw = buffer[data_start + start:data_start + end]
+        try:
+            tensor = raw.view(dtypes[info["dtype"]])
+        except RuntimeError:
+            # Misaligned for the element size, this one tensor gets its own copy
+            tensor = raw.clone().view(dtypes[info["dtype"]])
+        tensors[key] = tensor.reshape(info["shape"])
+    return tensors
+
+def attach_mmap_weights(module, directory):
+    """ Load every safetensors file in directory into module by reference (assign=True) """
+    # Weights already moved to a GPU gain nothing from a host mapping
+    if any(param.device.type != "cpu" for param in module.parameters()):
+        return 0
+    own = module.state_dict()
+    state = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.safetensors"))):
+        for key, tensor in mmap_safetensors(path).items():
+            if key in own and own[key].shape == tensor.shape and own[key].dtype == tensor.dtype:
+                state[key] = tensor
+    if state:
+        module.load_state_dict(state, strict=False, assign=True)
+        # Re-point tied parameters (e.g. shared embeddings) at the mapped tensors
+        if hasattr(module, "tie_weights"):
+            module.tie_weights()
+    return len(state)
@@ -0,0 +1,120 @@
+from collections import Counter
+import os
+import re
+import numpy as np
+from .CommentDedup_functions import dedup_key
+
+# Estimated tokens a recommendation prompt may use, instructions included
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 2500))
+# Example comments longer than this are cut at a word boundary
+PROMPT_EXAMPLE_MAX_CHARS = int(os.getenv("PROMPT_EXAMPLE_MAX_CHARS", 240))
+# Most frequent distinct comments of a group considered when picking representatives
+PROMPT_EXAMPLE_CANDIDATES = int(os.getenv("PROMPT_EXAMPLE_CANDIDATES", 200))
+
+# Gemini and most BPE tokenizers average about four characters per English token
+CHARS_PER_TOKEN = 4
+
+_WHITESPACE = re.compile(r"\s+")
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def truncate_comment(text, max_chars=PROMPT_EXAMPLE_MAX_CHARS):
+    """ Single-line comment of at most max_chars, cut at a word boundary """
+    text = _WHITESPACE.sub(" ", str(text)).strip()
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars - 1].rsplit(" ", 1)[0] or text[:max_chars - 1]
+    return cut.rstrip(" ,.;:") + "…"
+
+class PromptBuilder:
+    """
+    Recommendation prompts that stay within a token budget.
+
+    The fixed parts (summary, instructions) are always kept. Example comments
+    are grouped, e.g. per (topic, sentiment); each group is ranked by closeness
+    to its MiniLM centroid when an embed callable is given, else by frequency,
+    and examples are then added round-robin across groups until the budget is
+    spent, so every group gets its most representative comment first.
+    build() returns the prompt and a report of its estimated size.
+    """
+    def __init__(self, budget=PROMPT_TOKEN_BUDGET, max_example_chars=PROMPT_EXAMPLE_MAX_CHARS,
+                 examples_per_group=5, embed=None, candidates=PROMPT_EXAMPLE_CANDIDATES):
+        self.budget = budget
+        self.max_example_chars = max_example_chars
+        self.examples_per_group = examples_per_group
+        self.embed = embed
+        self.candidates = candidates
+
+    def representatives(self, texts):
+        """ Distinct texts of one group, most representative first """
+        counts = Counter()
+        first = {}
+        for text in texts:
+            if text is None or (isinstance(text, float) and text != text):
+                continue
+            key = dedup_key(text)
+            if not key:
+                continue
+            counts[key] += 1
+            first.setdefault(key, text)
+        ranked = [first[key] for key, _ in counts.most_common(self.candidates)]
+        if len(ranked) <= 1 or self.embed is None:
+            return ranked
+
+        embeddings = self.embed(ranked)
+        if embeddings is None:
+            return ranked
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        centroid = embeddings.mean(axis=0)
+        similarity = embeddings @ (centroid / max(np.linalg.norm(centroid), 1e-12))
+        # Stable sort keeps frequency order among equally central comments
+        return [ranked[i] for i in np.argsort(-similarity, kind="stable")]
+
+    def build(self, head, groups, tail, group_title=None):
+        """
+        head + example block + tail.
+
+        groups maps a key to its comments, in display order; group_title(key)
+        gives the heading line of a group. Returns (prompt, report).
+        """
+        group_title = group_title or str
+        remaining = self.budget - estimate_tokens(head) - estimate_tokens(tail)
+
+        ranked = {key: self.representatives(texts)[:self.examples_per_group] for key, texts in groups.items()}
+        chosen = {key: [] for key in ranked}
+        for rank in range(self.examples_per_group):
+            for key, examples in ranked.items():
+                if rank >= len(examples):
+                    continue
+                line = f"{len(chosen[key]) + 1}. {truncate_comment(examples[rank], self.max_example_chars)}"
+                cost = estimate_tokens(line) + 1
+                if not chosen[key]:
+                    cost += estimate_tokens(group_title(key)) + 1
+                if cost <= remaining:
+                    chosen[key].append(line)
+                    remaining -= cost
+
+        lines = []
+        for key, examples in chosen.items():
+            if examples:
+                lines.append(group_title(key))
+                lines.extend(examples)
+        prompt = head + "\n".join(lines) + tail
+
+        available = sum(len(examples) for examples in ranked.values())
+        included = sum(len(examples) for examples in chosen.values())
+        report = {
+            "estimated_tokens": estimate_tokens(prompt),
+            "budget": self.budget,
+            "examples": included,
+            "examples_dropped": available - included
+        }
+        return prompt, report
+
+def format_report(name, report):
+    return (
+        f"[{name}] prompt ~{report['estimated_tokens']} tokens (budget {report['budget']}), "
+        f"{report['examples']} examples, {report['examples_dropped']} dropped"
+    )
@@ -0,0 +1,74 @@
+import json
+import os
+import re
+import secrets
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS_DIR = os.getenv("UPLOAD_RESULTS_DIR", os.path.join(current_dir, "..", "cache", "upload_results"))
+# Seconds an unsaved upload result is kept before eviction
+DEFAULT_RESULT_TTL = int(os.getenv("UPLOAD_RESULT_TTL", 6 * 60 * 60))
+
+TOKEN_PATTERN = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+class UploadResultStore:
+    """
+    Server-side staging area for analyzed uploads awaiting /saveToDatabase.
+
+    Each result is a JSON file named by an opaque random token; only the token
+    goes into the Flask session, so the cookie stays small regardless of CSV size.
+    """
+    def __init__(self, directory=DEFAULT_RESULTS_DIR, ttl=DEFAULT_RESULT_TTL):
+        self.directory = os.path.abspath(directory)
+        self.ttl = ttl
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, token):
+        if not token or not TOKEN_PATTERN.match(token):
+            return None
+        return os.path.join(self.directory, f"{token}.json")
+
+    def put(self, result):
+        """ Store a result and return its token """
+        self.evict_expired()
+        token = secrets.token_urlsafe(24)
+        path = self._path(token)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+        return token
+
+    def exists(self, token):
+        path = self._path(token)
+        return bool(path) and os.path.exists(path) and time.time() - os.path.getmtime(path) <= self.ttl
+
+    def get(self, token):
+        """ Returns the stored result, or None if the token is unknown or expired """
+        path = self._path(token)
+        if not path or not os.path.exists(path):
+            return None
+        if time.time() - os.path.getmtime(path) > self.ttl:
+            self.delete(token)
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def delete(self, token):
+        path = self._path(token)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def evict_expired(self):
+        """ Remove every result older than the TTL """
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
@@ -0,0 +1,145 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import os
+import sys
+import threading
+import time
+
+# Intra-op threads per pipeline stage, e.g. "sentiment=2,embedding=1,classification=2".
+# Stages not listed share the CPUs evenly with the other stages that can run at the same time.
+STAGE_THREADS = os.getenv("UPLOAD_STAGE_THREADS", "")
+# Stages of one upload running at once
+STAGE_WORKERS = int(os.getenv("UPLOAD_STAGE_WORKERS", 3))
+
+def parse_stage_threads(spec=STAGE_THREADS):
+    """ {stage: threads} from "name=n,..." """
+    budgets = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, threads = item.partition("=")
+        if not threads.isdigit() or int(threads) < 1:
+            raise ValueError(f"Invalid UPLOAD_STAGE_THREADS entry: {item}")
+        budgets[name.strip()] = int(threads)
+    return budgets
+
+def stage_threads(name, concurrent=STAGE_WORKERS):
+    """ Thread budget of one stage: its UPLOAD_STAGE_THREADS entry, else an even share of the CPUs """
+    return parse_stage_threads().get(name) or max(1, (os.cpu_count() or 1) // max(1, concurrent))
+
+def set_thread_budget(threads):
+    """
+    Cap PyTorch intra-op threads of the calling thread, once as a dedicated
+    stage or batch thread starts.
+
+    Without this every concurrent stage would spread its kernels over all cores
+    and the stages would slow each other down. torch.set_num_threads also moves
+    the process-wide default that new threads start from, so the count is never
+    saved and restored around a stage: concurrent stages would restore each
+    other's values. Only applied once torch has been imported, so the helper
+    costs nothing for stages that do not use it.
+    """
+    torch = sys.modules.get("torch")
+    if threads and torch is not None:
+        torch.set_num_threads(threads)
+
+class Stage:
+    def __init__(self, name, fn, after=(), threads=None):
+        self.name = name
+        self.fn = fn
+        self.after = tuple(after)
+        self.threads = threads
+
+class StageExecutor:
+    """ One single-thread pool per stage, whose thread applies the stage's thread budget when it starts """
+    def __init__(self, stages, name="upload-stage"):
+        self.pools = {
+            stage.name: ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix=f"{name}-{stage.name}",
+                initializer=set_thread_budget,
+                initargs=(stage.threads,)
+            )
+            for stage in stages
+        }
+
+    def submit(self, stage, fn, *args):
+        return self.pools[stage.name].submit(fn, *args)
+
+    def shutdown(self, wait=True):
+        for pool in self.pools.values():
+            pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+class StageGraph:
+    """
+    Runs pipeline stages as a DAG, each stage on its own thread.
+
+    Each stage is fn(results) -> value, where results holds the values of the
+    stages it runs after, or of graph inputs passed to run() under the names
+    declared in inputs. A stage starts as soon as those are ready, so
+    independent stages such as sentiment and topic classification overlap;
+    PyTorch releases the GIL inside its kernels. At most workers stages run at
+    once. Giving each stage a dedicated thread lets its thread budget be set
+    once rather than around every call. Wall time per stage is summed
+    over every run() into timings, so chunked uploads report totals.
+    """
+    def __init__(self, inputs=(), workers=STAGE_WORKERS):
+        self.inputs = tuple(inputs)
+        self.stages = {}
+        self.workers = max(1, workers)
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, fn, after=(), threads=None):
+        if name in self.stages:
+            raise ValueError(f"Stage {name} is already defined")
+        missing = [dependency for dependency in after if dependency not in self.stages and dependency not in self.inputs]
+        if missing:
+            raise ValueError(f"Stage {name} runs after undefined stages: {', '.join(missing)}")
+        # Stages may only depend on earlier ones, which keeps the graph acyclic
+        self.stages[name] = Stage(name, fn, after, threads if threads is not None else stage_threads(name, self.workers))
+        return self
+
+    def _run_stage(self, stage, inputs):
+        started = time.perf_counter()
+        value = stage.fn(inputs)
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self.timings[stage.name] = self.timings.get(stage.name, 0.0) + seconds
+        return value
+
+    def run(self, executor=None, **inputs):
+        """ Run every stage once and return {stage: value}; the first stage error is raised """
+        missing = [name for name in self.inputs if name not in inputs]
+        if missing:
+            raise ValueError(f"Missing graph inputs: {', '.join(missing)}")
+        if executor is None:
+            with self.executor() as pool:
+                return self.run(pool, **inputs)
+
+        results = dict(inputs)
+        pending = dict(self.stages)
+        running = {}
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if len(running) >= self.workers:
+                    break
+                if all(dependency in results for dependency in stage.after):
+                    stage_inputs = {dependency: results[dependency] for dependency in stage.after}
+                    running[executor.submit(stage, self._run_stage, stage, stage_inputs)] = name
+                    del pending[name]
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+        return {name: results[name] for name in self.stages}
+
+    def executor(self):
+        """ Stage threads of this graph, to share across run() calls over one upload """
+        return StageExecutor(self.stages.values())
+
+    def report(self):
+        """ {stage: seconds} rounded like the upload job stage timings """
+        return {name: round(seconds, 3) for name, seconds in self.timings.items()}
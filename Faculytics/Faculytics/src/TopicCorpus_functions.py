@@ -0,0 +1,219 @@
+from datetime import datetime, timezone
+import pandas as pd
+import numpy as np
+import json
+import os
+import shutil
+import threading
+import traceback
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TOPIC_MODEL_DIR = os.getenv("TOPIC_MODEL_DIR", os.path.join(current_dir, "..", "cache", "topic_models"))
+# Number of fitted versions kept on disk, the current one included
+DEFAULT_KEEP_VERSIONS = int(os.getenv("TOPIC_MODEL_KEEP_VERSIONS", 3))
+# A corpus smaller than this gives clusters no better than the per-upload refit
+DEFAULT_MIN_DOCUMENTS = int(os.getenv("TOPIC_MODEL_MIN_DOCUMENTS", 200))
+# Keywords reported per topic, same as BERTopic's top_n_words default
+DEFAULT_TOP_N_WORDS = 10
+
+CURRENT_FILE = "CURRENT"
+META_FILE = "meta.json"
+
+class CorpusTopicModel:
+    """
+    Versioned corpus-level BERTopic model.
+
+    The model is fitted offline over every stored comment (`flask refit-topic-model`
+    or the refit schedule) and saved under <directory>/<version>/. Uploads only
+    call transform on it and extract their own keywords with c-TF-IDF, so nothing
+    shared is refitted while requests are running. The CURRENT file names the
+    version in use; a refit writes a new version and then flips it.
+    """
+    def __init__(self, directory=DEFAULT_TOPIC_MODEL_DIR, keep=DEFAULT_KEEP_VERSIONS, min_documents=DEFAULT_MIN_DOCUMENTS):
+        self.directory = os.path.abspath(directory)
+        self.keep = max(1, keep)
+        self.min_documents = min_documents
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._model = None
+        self._loaded_version = None
+        self._load_lock = threading.Lock()
+        # Only one refit at a time, whether from the CLI, the schedule or both
+        self._fit_lock = threading.Lock()
+        self._schedule = None
+
+    def current_version(self):
+        """ Version named by the CURRENT file, or None before the first fit """
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE), "r", encoding="utf-8") as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        if version and os.path.isdir(os.path.join(self.directory, version)):
+            return version
+        return None
+
+    def versions(self):
+        """ Metadata of every fitted version on disk, newest first """
+        found = []
+        for name in os.listdir(self.directory):
+            meta_path = os.path.join(self.directory, name, META_FILE)
+            if os.path.isfile(meta_path):
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    found.append(json.load(f))
+        return sorted(found, key=lambda meta: meta["version"], reverse=True)
+
+    def is_ready(self):
+        return self.current_version() is not None
+
+    def load(self):
+        """ The model of the current version, reloaded only when CURRENT has changed """
+        version = self.current_version()
+        if version is None:
+            return None
+        if version != self._loaded_version:
+            with self._load_lock:
+                if version != self._loaded_version:
+                    from bertopic import BERTopic
+                    self._model = BERTopic.load(os.path.join(self.directory, version))
+                    self._loaded_version = version
+        return self._model
+
+    @property
+    def version(self):
+        return self._loaded_version
+
+    def fit(self, documents, embeddings, build_model, embedding_model_id=None):
+        """
+        Fit a new version over the whole corpus and make it current.
+
+        build_model() returns an unfitted BERTopic configured like the per-upload
+        one; documents must be cleaned the same way uploads are. Returns the version.
+        """
+        if len(documents) < self.min_documents:
+            raise ValueError(f"Need at least {self.min_documents} comments to fit a corpus topic model, got {len(documents)}")
+
+        with self._fit_lock:
+            model = build_model()
+            model.fit(documents, np.asarray(embeddings, dtype=np.float32))
+
+            created = datetime.now(timezone.utc)
+            version = created.strftime("%Y%m%dT%H%M%S%fZ")
+            path = os.path.join(self.directory, version)
+            # safetensors keeps topic embeddings and c-TF-IDF but drops UMAP/HDBSCAN,
+            # so transform assigns topics by similarity to the topic embeddings
+            model.save(path, serialization="safetensors", save_ctfidf=True, save_embedding_model=embedding_model_id)
+
+            meta = {
+                "version": version,
+                "created": created.isoformat(),
+                "documents": len(documents),
+                "topics": len(model.get_topic_info()),
+                "embedding_model": embedding_model_id
+            }
+            with open(os.path.join(path, META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+
+            tmp_current = os.path.join(self.directory, f"{CURRENT_FILE}.tmp")
+            with open(tmp_current, "w", encoding="utf-8") as f:
+                f.write(version)
+            os.replace(tmp_current, os.path.join(self.directory, CURRENT_FILE))
+
+            self.prune()
+            return version
+
+    def prune(self):
+        """ Remove all but the newest `keep` versions, never the current one """
+        current = self.current_version()
+        removed = 0
+        for meta in self.versions()[self.keep:]:
+            if meta["version"] == current:
+                continue
+            shutil.rmtree(os.path.join(self.directory, meta["version"]), ignore_errors=True)
+            removed += 1
+        return removed
+
+    def keywords(self, documents, embeddings, top_n=DEFAULT_TOP_N_WORDS):
+        """
+        {topic_id: [(word, score), ...]} for one upload, the shape of BERTopic.get_topics().
+
+        Comments are assigned to corpus topics with transform, then c-TF-IDF is
+        computed over this upload's comments per topic using the corpus IDF weights.
+        """
+        accumulator = self.keyword_accumulator(top_n)
+        accumulator.add(documents, embeddings)
+        return accumulator.topics()
+
+    def keyword_accumulator(self, top_n=DEFAULT_TOP_N_WORDS):
+        """ KeywordAccumulator on the current version, loading it if needed """
+        if self.load() is None:
+            raise RuntimeError("No corpus topic model has been fitted yet")
+        # Model and version are read together, so a concurrent reload cannot mix them
+        with self._load_lock:
+            model, version = self._model, self._loaded_version
+        return KeywordAccumulator(model, top_n, version)
+
+    def schedule_refit(self, interval, refit):
+        """
+        Call refit() every `interval` seconds on a daemon thread.
+
+        refit is expected to gather the corpus and call fit(); failures are logged
+        and the current version stays in use until the next run.
+        """
+        if interval <= 0 or self._schedule is not None:
+            return None
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    refit()
+                except Exception:
+                    traceback.print_exc()
+
+        thread = threading.Thread(target=loop, name="topic-model-refit", daemon=True)
+        thread.start()
+        self._schedule = stop
+        return stop
+
+class KeywordAccumulator:
+    """
+    Running per-topic term counts for CorpusTopicModel.keywords.
+
+    add() transforms one chunk of documents and sums its term counts into the
+    topic it was assigned; topics() applies the corpus c-TF-IDF weights once at
+    the end. Memory stays at one sparse count row per topic however many chunks
+    are added, and the model version is fixed for the whole upload.
+    """
+    def __init__(self, model, top_n=DEFAULT_TOP_N_WORDS, version=None):
+        self.model = model
+        self.version = version
+        self.top_n = top_n
+        self.counts = {}
+
+    def add(self, documents, embeddings):
+        if not documents:
+            return
+        topics, _ = self.model.transform(documents, np.asarray(embeddings, dtype=np.float32))
+
+        grouped = pd.DataFrame({"Document": documents, "Topic": topics}).groupby("Topic", as_index=False).agg({"Document": " ".join})
+        counts = self.model.vectorizer_model.transform(grouped["Document"])
+        for topic, row in zip(grouped["Topic"], counts):
+            topic = int(topic)
+            self.counts[topic] = self.counts[topic] + row if topic in self.counts else row
+
+    def topics(self):
+        if not self.counts:
+            return {}
+        from scipy.sparse import vstack
+
+        topic_ids = sorted(self.counts)
+        ctfidf = self.model.ctfidf_model.transform(vstack([self.counts[topic] for topic in topic_ids]).tocsr())
+        words = self.model.vectorizer_model.get_feature_names_out()
+
+        topic_words = {}
+        for topic, row in zip(topic_ids, ctfidf):
+            row = row.toarray().ravel()
+            best = [i for i in np.argsort(row)[::-1][:self.top_n] if row[i] > 0]
+            topic_words[topic] = [(words[i], float(row[i])) for i in best]
+        return topic_words
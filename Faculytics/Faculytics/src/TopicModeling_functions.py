@@ -3,14 +3,74 @@ from transformers import pipeline
 from bertopic import BERTopic
 from umap import UMAP
 from sklearn.feature_extraction.text import CountVectorizer
+from collections import Counter
 import pandas as pd
 import numpy as np
+import hashlib
+import os
+import threading
+from .CommentDedup_functions import CommentDedup
+from .InferenceBackends_functions import INFERENCE_BACKEND, OnnxSentenceEncoder, cache_suffix, check_backend, onnx_model_dir, quantize_int8
+
+EMBEDDING_MODEL_ID = "all-MiniLM-L6-v2"
+ZERO_SHOT_MODEL_ID = "facebook/bart-large-mnli"
+
+# "zero-shot" runs BART-MNLI per comment, "embedding" matches MiniLM embeddings against label prototypes
+CLASSIFIER_MODE = os.getenv("TOPIC_CLASSIFIER_MODE", "zero-shot")
+CLASSIFIER_MODES = ("zero-shot", "embedding")
+
+# Short descriptions averaged with the label itself to build each topic prototype
+LABEL_PROTOTYPES = {
+    "Teaching Effectiveness": ["explains the lessons clearly", "we learn a lot from the teacher"],
+    "Preparedness and Punctuality": ["always prepared for class", "starts and ends class on time"],
+    "Fairness and Supportiveness": ["treats all students fairly", "supportive and understanding teacher"],
+    "Student Engagement": ["makes the class interactive", "encourages students to participate"],
+    "Professional Appearance": ["dresses professionally", "wears the faculty uniform"],
+    "Cleanliness and Classroom Management": ["keeps the classroom clean and orderly", "manages the class well"],
+    "Teaching Quality": ["good quality of teaching", "teaches well and knows the subject"],
+    "Availability and Communication": ["approachable and easy to talk to", "responds to messages and consultations"],
+    "Tardiness": ["always late to class", "often absent or comes late"],
+    "Assessment Fairness and Difficulty": ["exams are too hard", "grading and quizzes are fair"],
+    "Instructional Materials and Aids": ["uses slides and handouts", "provides good learning materials"]
+}
+
+# Softmax temperature applied to cosine similarities when reporting a probability
+SIMILARITY_TEMPERATURE = 0.05
+
+# "corpus" reuses the offline-fitted CorpusTopicModel for keywords, "refit" fits BERTopic on each upload.
+# Corpus mode falls back to refitting until a corpus model has been fitted.
+TOPIC_MODEL_MODE = os.getenv("TOPIC_MODEL_MODE", "corpus")
+TOPIC_MODEL_MODES = ("corpus", "refit")
 
 class CommentProcessor:
-    def __init__(self):
-        # Load models only once
-        self.bert_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
+    def __init__(self, cache=None, classifier_mode=CLASSIFIER_MODE, corpus_model=None, topic_model_mode=TOPIC_MODEL_MODE, store=None, backend=INFERENCE_BACKEND):
+        if classifier_mode not in CLASSIFIER_MODES:
+            raise ValueError(f"Unknown topic classifier mode: {classifier_mode}")
+        if topic_model_mode not in TOPIC_MODEL_MODES:
+            raise ValueError(f"Unknown topic model mode: {topic_model_mode}")
+
+        # Optional ModelStore: load pinned local snapshots instead of the Hub
+        self.store = store
+
+        # Load models only once; the backend applies to the MiniLM encoder, BART stays fp32
+        self.backend = check_backend(backend)
+        if self.backend == "onnx":
+            self.bert_model = OnnxSentenceEncoder(onnx_model_dir("embedding"))
+        elif store:
+            source, revision = store.resolve("embedding")
+            self.bert_model = SentenceTransformer(source, revision=revision)
+            store.attach_weights("embedding", self.bert_model[0].auto_model)
+        else:
+            self.bert_model = SentenceTransformer(EMBEDDING_MODEL_ID)
+        if self.backend == "int8":
+            self.bert_model.to("cpu")
+            quantize_int8(self.bert_model[0].auto_model)
+        self.classifier_mode = classifier_mode
+        self._classifier = None
+        self._label_embeddings = None
+
+        # Optional InferenceCache shared with SentimentAnalyzer
+        self.cache = cache
 
         self.candidate_labels = [
             "Teaching Effectiveness", "Preparedness and Punctuality", "Fairness and Supportiveness", "Student Engagement",
@@ -19,59 +79,265 @@ class CommentProcessor:
             "Instructional Materials and Aids"
         ]
 
-        # Initialize BERTopic once, adding n-gram support using CountVectorizer
+        # Initialize BERTopic once for the per-upload refit path
+        self.topic_model = self.build_topic_model()
+        # The shared BERTopic instance is refitted per upload, so upload workers take turns
+        self._fit_lock = threading.Lock()
+
+        # Optional CorpusTopicModel fitted offline over all stored comments
+        self.corpus_model = corpus_model
+        self.topic_model_mode = topic_model_mode
+
+        # Cache keys carry the model revision, like SentimentAnalyzer's, so a synced update invalidates them.
+        # Zero-shot results also depend on the label set, so it is part of that key
+        if self.backend == "onnx":
+            embedding_commit = self.bert_model.info.get("revision")
+        else:
+            embedding_commit = getattr(self.bert_model[0].auto_model.config, "_commit_hash", None)
+        self.embedding_cache_model = f"{EMBEDDING_MODEL_ID}@{self.model_revision('embedding', embedding_commit)}{cache_suffix(self.backend)}"
+        self._labels_hash = hashlib.sha256("|".join(self.candidate_labels).encode("utf-8")).hexdigest()[:12]
+        self._zero_shot_cache_model = None
+
+    def model_revision(self, name, commit=None):
+        """ Revision for a cache key: the loaded model's commit hash, else the store's pinned revision """
+        if not commit and self.store:
+            commit = self.store.entry(name)["revision"]
+        return commit or "main"
+
+    @property
+    def zero_shot_cache_model(self):
+        """ Zero-shot cache key; without a store the revision is only known once BART-MNLI is loaded """
+        if self._zero_shot_cache_model is None:
+            commit = None if self.store else getattr(self.classifier.model.config, "_commit_hash", None)
+            self._zero_shot_cache_model = f"{ZERO_SHOT_MODEL_ID}@{self.model_revision('zero-shot', commit)}#{self._labels_hash}"
+        return self._zero_shot_cache_model
+
+    def build_topic_model(self):
+        """ Unfitted BERTopic with the project settings, shared by the per-upload and corpus fits """
         vectorizer = CountVectorizer(stop_words='english', ngram_range=(1, 2))  # Use both unigrams and bigrams
-        self.topic_model = BERTopic(
+        return BERTopic(
             umap_model=UMAP(n_neighbors=15, min_dist=0.05, metric='cosine'),
             vectorizer_model=vectorizer,  # Use CountVectorizer for n-grams
             min_topic_size=5
         )
 
+    @property
+    def uses_corpus_model(self):
+        return self.topic_model_mode == "corpus" and self.corpus_model is not None and self.corpus_model.is_ready()
+
+    @property
+    def classification_uses_embeddings(self):
+        """ Embedding classification waits for the MiniLM vectors, zero-shot can run alongside them """
+        return self.classifier_mode == "embedding"
+
+    def fit_corpus_model(self, comments):
+        """ Fit a new corpus model version from raw comment texts. Returns the version """
+        if self.corpus_model is None:
+            raise RuntimeError("CommentProcessor was created without a corpus model")
+        cleaned = self.preprocess_comments(pd.DataFrame({"comment": comments}))["cleaned_comment"].tolist()
+        embeddings = self.encode_comments(cleaned)
+        return self.corpus_model.fit(cleaned, embeddings, self.build_topic_model, EMBEDDING_MODEL_ID)
+
+    @property
+    def classifier(self):
+        """ BART-MNLI pipeline, only loaded when zero-shot classification is used """
+        if self._classifier is None:
+            if self.store:
+                source, revision = self.store.resolve("zero-shot")
+                self._classifier = pipeline("zero-shot-classification", model=source, revision=revision)
+                self.store.attach_weights("zero-shot", self._classifier.model)
+            else:
+                self._classifier = pipeline("zero-shot-classification", model=ZERO_SHOT_MODEL_ID)
+        return self._classifier
+
+    @property
+    def label_embeddings(self):
+        """ Unit-length prototype vector per candidate label, computed once """
+        if self._label_embeddings is None:
+            prototypes = []
+            for label in self.candidate_labels:
+                phrases = [label] + LABEL_PROTOTYPES.get(label, [])
+                vectors = self.bert_model.encode(phrases, convert_to_tensor=False, normalize_embeddings=True)
+                prototype = np.mean(vectors, axis=0)
+                prototypes.append(prototype / np.linalg.norm(prototype))
+            self._label_embeddings = np.array(prototypes, dtype=np.float32)
+        return self._label_embeddings
+
     def preprocess_comments(self, df):
         """ Clean and prepare text data """
         df["cleaned_comment"] = df["comment"].astype(str).str.lower().str.replace(r'\W+', ' ', regex=True)
         return df
 
     def encode_comments(self, comments):
-        """ Generate sentence embeddings efficiently """
-        return np.array(self.bert_model.encode(comments, convert_to_tensor=False))
-
-    def classify_comments(self, comments):
-        """ Perform batch classification to improve speed """
-        results = self.classifier(comments, self.candidate_labels)
-        topics = [res["labels"][0] for res in results]
-        probabilities = [res["scores"][0] * 100 for res in results]  # Multiply by 100
+        """ Generate sentence embeddings efficiently, reusing cached vectors """
+        cached = self.cache.get_many("embedding", self.embedding_cache_model, comments) if self.cache else {}
+        missing = [i for i in range(len(comments)) if i not in cached]
+
+        if missing:
+            fresh = self.bert_model.encode([comments[i] for i in missing], convert_to_tensor=False)
+            for i, vector in zip(missing, fresh):
+                cached[i] = vector
+            if self.cache:
+                self.cache.put_many("embedding", self.embedding_cache_model, [(comments[i], cached[i]) for i in missing])
+
+        if not comments:
+            return np.empty((0, self.bert_model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.array([cached[i] for i in range(len(comments))], dtype=np.float32)
+
+    def classify_comments(self, comments, embeddings=None, mode=None):
+        """ Assign one candidate label per comment using the configured classifier """
+        mode = mode or self.classifier_mode
+        if mode == "embedding":
+            if embeddings is None:
+                embeddings = self.encode_comments(comments)
+            return self.classify_by_similarity(embeddings)
+        return self.classify_zero_shot(comments)
+
+    def embed_and_classify(self, comments):
+        """ (embeddings, (topics, probabilities)) per comment, running the models once per distinct comment """
+        dedup = CommentDedup(comments)
+        embeddings = self.encode_comments(dedup.unique)
+        topics, probabilities = self.classify_comments(dedup.unique, embeddings)
+        return dedup.scatter(embeddings), (dedup.scatter(topics), dedup.scatter(probabilities))
+
+    def classify_by_similarity(self, embeddings):
+        """ Vectorized cosine similarity between comment embeddings and label prototypes """
+        if len(embeddings) == 0:
+            return [], []
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        similarities = (embeddings / np.maximum(norms, 1e-12)) @ self.label_embeddings.T
+
+        scaled = similarities / SIMILARITY_TEMPERATURE
+        scaled -= scaled.max(axis=1, keepdims=True)
+        scores = np.exp(scaled)
+        scores /= scores.sum(axis=1, keepdims=True)
+
+        best = scores.argmax(axis=1)
+        topics = [self.candidate_labels[i] for i in best]
+        probabilities = (scores[np.arange(len(best)), best] * 100).tolist()  # Multiply by 100
         return topics, probabilities
 
+    def classify_zero_shot(self, comments):
+        """ Perform batch classification to improve speed, skipping cached comments """
+        cached = self.cache.get_many("zero-shot", self.zero_shot_cache_model, comments) if self.cache else {}
+        missing = [i for i in range(len(comments)) if i not in cached]
+
+        if missing:
+            results = self.classifier([comments[i] for i in missing], self.candidate_labels)
+            if isinstance(results, dict):
+                results = [results]
+            for i, res in zip(missing, results):
+                cached[i] = {"topic": res["labels"][0], "probability": res["scores"][0] * 100}  # Multiply by 100
+            if self.cache:
+                self.cache.put_many("zero-shot", self.zero_shot_cache_model, [(comments[i], cached[i]) for i in missing])
+
+        topics = [cached[i]["topic"] for i in range(len(comments))]
+        probabilities = [cached[i]["probability"] for i in range(len(comments))]
+        return topics, probabilities
+
+    def stream(self):
+        """ TopicStream that takes an upload in row chunks, see process_comments for the whole-frame version """
+        return TopicStream(self)
+
     def process_comments(self, df):
+        """ (records, top words, category distribution, corpus model version used or None) """
+        # Loads the corpus model on first use; None when refitting per upload
+        keywords = self.corpus_model.keyword_accumulator() if self.uses_corpus_model else None
         df = self.preprocess_comments(df)
         comments = df["cleaned_comment"].tolist()
 
-        # Generate embeddings (single batch)
-        embeddings = self.encode_comments(comments)
-
-        # Perform classification (single batch)
-        df["Final_Topic"], df["Topic_Probability"] = self.classify_comments(comments)
+        # Generate embeddings and classify (single batch of distinct comments)
+        embeddings, (topics, probabilities) = self.embed_and_classify(comments)
+        df["Final_Topic"], df["Topic_Probability"] = topics, probabilities
 
         # Calculate category distribution
         category_counts = df["Final_Topic"].value_counts(normalize=True).reset_index()
         category_counts.columns = ["Category", "Probability"]
         category_counts["Probability"] *= 100
 
-        # Fit BERTopic using precomputed embeddings
-        topics, _ = self.topic_model.fit_transform(comments, embeddings)
-
-        # Extract top words for each topic
-        word_counts = {}
-        for topic in self.topic_model.get_topics().values():
-            for word, prob in topic:
-                word_counts[word] = word_counts.get(word, 0) + prob
+        if keywords is not None:
+            # Assign comments to the corpus topics and weigh this upload's words only
+            keywords.add(comments, embeddings)
+            fitted_topics = keywords.topics()
+        else:
+            # Fit BERTopic using precomputed embeddings
+            with self._fit_lock:
+                topics, _ = self.topic_model.fit_transform(comments, embeddings)
+                fitted_topics = self.topic_model.get_topics()
 
-        top_20_words = sorted(word_counts.items(), key=lambda x: x[1], reverse=True)[:20]
+        top_20_words = top_words(fitted_topics)
 
         return (
             df[["comment", "Final_Topic", "Topic_Probability"]].to_dict(orient="records"),
             top_20_words,
-            category_counts.to_dict(orient="records")
+            category_counts.to_dict(orient="records"),
+            keywords.version if keywords is not None else None
         )
 
+def top_words(fitted_topics, n=20):
+    """ Keyword weights summed across topics, highest first """
+    word_counts = {}
+    for topic in fitted_topics.values():
+        for word, prob in topic:
+            word_counts[word] = word_counts.get(word, 0) + prob
+    return sorted(word_counts.items(), key=lambda x: x[1], reverse=True)[:n]
+
+class TopicStream:
+    """
+    process_comments for an upload fed in row chunks.
+
+    add() cleans, embeds and classifies one chunk and returns its per-comment
+    records; only the category counts and, with the corpus model, the per-topic
+    keyword counts are kept across chunks. finish() returns the top words and
+    category distribution. The per-upload refit needs every embedding at once,
+    so in that mode the cleaned comments and embeddings are kept until finish().
+    """
+    def __init__(self, processor):
+        self.processor = processor
+        self.categories = Counter()
+        self.total = 0
+        self.keywords = processor.corpus_model.keyword_accumulator() if processor.uses_corpus_model else None
+        self.topic_model_version = self.keywords.version if self.keywords is not None else None
+        self._comments = []
+        self._embeddings = []
+
+    def prepare(self, df):
+        """ Clean one chunk in place, returning the texts the models see """
+        return self.processor.preprocess_comments(df)["cleaned_comment"].tolist()
+
+    def add(self, df):
+        comments = self.prepare(df)
+        embeddings, classification = self.processor.embed_and_classify(comments)
+        return self.collect(df, comments, embeddings, classification)
+
+    def collect(self, df, comments, embeddings, classification):
+        """ Fold one prepared, embedded and classified chunk into the running aggregates """
+        df["Final_Topic"], df["Topic_Probability"] = classification
+
+        self.categories.update(df["Final_Topic"])
+        self.total += len(df)
+        if self.keywords is not None:
+            self.keywords.add(comments, embeddings)
+        else:
+            self._comments.extend(comments)
+            self._embeddings.append(embeddings)
+
+        return df[["comment", "Final_Topic", "Topic_Probability"]].to_dict(orient="records")
+
+    def finish(self):
+        """ (top_20_words, category_counts) over every chunk added """
+        if self.keywords is not None:
+            fitted_topics = self.keywords.topics()
+        else:
+            embeddings = np.vstack(self._embeddings) if self._embeddings else np.empty((0, 0), dtype=np.float32)
+            with self.processor._fit_lock:
+                self.processor.topic_model.fit_transform(self._comments, embeddings)
+                fitted_topics = self.processor.topic_model.get_topics()
+            self._comments, self._embeddings = [], []
+
+        category_counts = [
+            {"Category": category, "Probability": count / self.total * 100}
+            for category, count in self.categories.most_common()
+        ]
+        return top_words(fitted_topics), category_counts
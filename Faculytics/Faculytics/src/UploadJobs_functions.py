@@ -0,0 +1,290 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_JOBS_DIR = os.getenv("UPLOAD_JOBS_DIR", os.path.join(current_dir, "..", "cache", "upload_jobs"))
+DEFAULT_JOB_WORKERS = int(os.getenv("UPLOAD_JOB_WORKERS", 2))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("UPLOAD_JOB_MAX_ATTEMPTS", 3))
+# A running job whose heartbeat is older than this is assumed orphaned by a dead worker and re-queued
+DEFAULT_LEASE_SECONDS = int(os.getenv("UPLOAD_JOB_LEASE_SECONDS", 120))
+# Seconds a finished or failed job, its input file and result are kept before eviction
+DEFAULT_JOB_TTL = int(os.getenv("UPLOAD_JOB_TTL", 24 * 60 * 60))
+# Delay before the first automatic retry of a failed attempt, doubled for each further one
+DEFAULT_RETRY_DELAY = float(os.getenv("UPLOAD_JOB_RETRY_DELAY", 5))
+
+# Stages of the upload analysis, in the order they are reported to the client.
+# The recommendation is generated by a separate queue once the upload is saved.
+JOB_STAGES = ["parse", "sentiment", "topics"]
+RECOMMENDATION_JOBS_DIR = os.getenv("RECOMMENDATION_JOBS_DIR", os.path.join(current_dir, "..", "cache", "recommendation_jobs"))
+RECOMMENDATION_STAGES = ["recommendation"]
+
+class UploadJobQueue:
+    """
+    Background runner for /upload analysis jobs, and with its own directory and
+    stages for the recommendations generated after an upload is saved.
+
+    Job state lives in a local SQLite file and the uploaded CSV is kept on disk,
+    so a job outlives the request that created it and can be re-run after a
+    failure or a server restart. Every web worker shares the same file: a job
+    runs on the worker that atomically claims it, which keeps its lease alive
+    with a heartbeat; jobs whose lease expired are re-queued. The pipeline is a callable
+    pipeline(params, input_path, progress) returning a JSON-serializable result;
+    progress(stage) marks the start of each stage; progress(stage, rows=n) reports
+    rows processed so far, again for the running stage without restarting its timer.
+    Failed attempts are retried after retry_delay seconds, doubling each time.
+    on_failure(params, error), if given, runs once a job has failed for good.
+    """
+    def __init__(self, pipeline, jobs_dir=DEFAULT_JOBS_DIR, workers=DEFAULT_JOB_WORKERS, max_attempts=DEFAULT_MAX_ATTEMPTS, stages=JOB_STAGES, name="upload-job", input_suffix=".csv",
+                 lease_seconds=DEFAULT_LEASE_SECONDS, ttl=DEFAULT_JOB_TTL, on_failure=None, retry_delay=DEFAULT_RETRY_DELAY):
+        self.pipeline = pipeline
+        self.on_failure = on_failure
+        self.stages = list(stages)
+        self.input_suffix = input_suffix
+        self.jobs_dir = os.path.abspath(jobs_dir)
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.ttl = ttl
+        self.retry_delay = retry_delay
+        # Identifies this worker process in the owner column of the jobs it claims
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.jobs_dir, "jobs.sqlite3"), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS upload_jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                stage TEXT,
+                stages TEXT NOT NULL,
+                params TEXT NOT NULL,
+                input_path TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                heartbeat REAL,
+                not_before REAL,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            )"""
+        )
+        # Job files created before claiming was added lack the lease columns
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(upload_jobs)")}
+        for column, kind in (("owner", "TEXT"), ("heartbeat", "REAL"), ("not_before", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE upload_jobs ADD COLUMN {column} {kind}")
+        self._conn.commit()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+
+        self._heartbeat = threading.Thread(target=self._maintain, name=f"{name}-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def submit(self, params, file_bytes):
+        """ Store the input file and job row, then queue it. Returns the job id immediately """
+        job_id = uuid.uuid4().hex
+        input_path = os.path.join(self.jobs_dir, f"{job_id}{self.input_suffix}")
+        with open(input_path, "wb") as f:
+            f.write(file_bytes)
+
+        self.evict_expired()
+        now = time.time()
+        stages = {stage: {"status": "pending", "seconds": None} for stage in self.stages}
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO upload_jobs (job_id, status, stage, stages, params, input_path, created, updated) VALUES (?, 'queued', NULL, ?, ?, ?, ?, ?)",
+                (job_id, json.dumps(stages), json.dumps(params), input_path, now, now)
+            )
+            self._conn.commit()
+
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, status, stage, stages, params, result, error, attempts, created, updated FROM upload_jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "stage": row[2],
+            "stages": json.loads(row[3]),
+            "params": json.loads(row[4]),
+            "result": json.loads(row[5]) if row[5] else None,
+            "error": row[6],
+            "attempts": row[7],
+            "created": row[8],
+            "updated": row[9]
+        }
+
+    def retry(self, job_id):
+        """ Re-queue a failed job. Returns False if the job is not in a failed state """
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE upload_jobs SET status = 'queued', error = NULL, not_before = NULL, updated = ? WHERE job_id = ? AND status = 'failed'",
+                (time.time(), job_id)
+            ).rowcount
+            self._conn.commit()
+        if updated:
+            self._executor.submit(self._run, job_id)
+        return bool(updated)
+
+    def resume_pending(self):
+        """
+        Queue jobs left behind by a previous or dead worker: running jobs whose
+        lease expired are put back to queued, and every queued job is submitted.
+        Only the worker whose claim succeeds runs a job, so calling this from
+        every web worker is safe.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE upload_jobs SET status = 'queued', owner = NULL, updated = ? WHERE status = 'running' AND (heartbeat IS NULL OR heartbeat < ?)",
+                (now, now - self.lease_seconds)
+            )
+            self._conn.commit()
+            rows = self._conn.execute("SELECT job_id, not_before FROM upload_jobs WHERE status = 'queued'").fetchall()
+        for job_id, not_before in rows:
+            self._schedule(job_id, (not_before or now) - now)
+        return len(rows)
+
+    def _schedule(self, job_id, delay=0):
+        """ Run a queued job on the executor, once delay seconds have passed """
+        if delay <= 0:
+            self._executor.submit(self._run, job_id)
+            return
+        timer = threading.Timer(delay, self._executor.submit, (self._run, job_id))
+        timer.daemon = True
+        timer.start()
+
+    def evict_expired(self):
+        """ Remove done and failed jobs, with their input files, last updated before the TTL """
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, input_path FROM upload_jobs WHERE status IN ('done', 'failed') AND updated < ?",
+                (cutoff,)
+            ).fetchall()
+            self._conn.executemany("DELETE FROM upload_jobs WHERE job_id = ?", [(job_id,) for job_id, _ in rows])
+            self._conn.commit()
+        for _, input_path in rows:
+            try:
+                os.remove(input_path)
+            except OSError:
+                continue
+        return len(rows)
+
+    def _maintain(self):
+        """ Heartbeat of the jobs this worker runs, plus pickup of orphaned jobs and eviction """
+        interval = max(1.0, self.lease_seconds / 3)
+        while True:
+            time.sleep(interval)
+            try:
+                with self._lock:
+                    self._conn.execute(
+                        "UPDATE upload_jobs SET heartbeat = ? WHERE owner = ? AND status = 'running'",
+                        (time.time(), self.owner)
+                    )
+                    self._conn.commit()
+                    expired = self._conn.execute(
+                        "SELECT COUNT(*) FROM upload_jobs WHERE status = 'running' AND (heartbeat IS NULL OR heartbeat < ?)",
+                        (time.time() - self.lease_seconds,)
+                    ).fetchone()[0]
+                if expired:
+                    self.resume_pending()
+                self.evict_expired()
+            except Exception:
+                traceback.print_exc()
+
+    def _claim(self, job_id):
+        """ Atomically take a queued job for this worker. Returns False if another worker has it """
+        now = time.time()
+        stages = {stage: {"status": "pending", "seconds": None} for stage in self.stages}
+        with self._lock:
+            claimed = self._conn.execute(
+                "UPDATE upload_jobs SET status = 'running', owner = ?, heartbeat = ?, stage = NULL, stages = ?, attempts = attempts + 1, updated = ? "
+                "WHERE job_id = ? AND status = 'queued' AND (not_before IS NULL OR not_before <= ?)",
+                (self.owner, now, json.dumps(stages), now, job_id, now)
+            ).rowcount
+            self._conn.commit()
+        return bool(claimed)
+
+    def _update(self, job_id, **fields):
+        """ Update a job this worker owns; a no-op once its lease passed to another worker """
+        now = time.time()
+        fields["updated"] = now
+        fields["heartbeat"] = now
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE upload_jobs SET {assignments} WHERE job_id = ? AND owner = ?",
+                list(fields.values()) + [job_id, self.owner]
+            )
+            self._conn.commit()
+
+    def _run(self, job_id):
+        if not self._claim(job_id):
+            return
+        job = self.get(job_id)
+
+        with self._lock:
+            row = self._conn.execute("SELECT input_path FROM upload_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        input_path = row[0]
+
+        stages = dict(job["stages"])
+        attempts = job["attempts"]
+        current = {"stage": None, "started": None}
+
+        def finish_stage():
+            if current["stage"]:
+                stages[current["stage"]].update(status="done", seconds=round(time.perf_counter() - current["started"], 3))
+
+        def progress(stage, rows=None):
+            if stage != current["stage"]:
+                finish_stage()
+                current["stage"] = stage
+                current["started"] = time.perf_counter()
+                stages[stage] = {"status": "running", "seconds": None}
+            if rows is not None:
+                stages[stage]["rows"] = rows
+            self._update(job_id, stage=stage, stages=json.dumps(stages))
+
+        try:
+            result = self.pipeline(job["params"], input_path, progress)
+            finish_stage()
+            self._update(job_id, status="done", stage=None, stages=json.dumps(stages), result=json.dumps(result), owner=None)
+        except Exception as e:
+            traceback.print_exc()
+            if current["stage"]:
+                stages[current["stage"]] = {"status": "failed", "seconds": None}
+            # Input errors (bad CSV) are not worth retrying automatically
+            retryable = not isinstance(e, ValueError) and attempts < self.max_attempts
+            # Backing off lets a rate limit or an open circuit breaker recover before the next attempt
+            delay = self.retry_delay * 2 ** (attempts - 1) if retryable else 0
+            self._update(
+                job_id,
+                status="queued" if retryable else "failed",
+                stages=json.dumps(stages),
+                error=str(e),
+                owner=None,
+                not_before=time.time() + delay if retryable else None
+            )
+            if retryable:
+                self._schedule(job_id, delay)
+            elif self.on_failure:
+                try:
+                    self.on_failure(job["params"], e)
+                except Exception:
+                    traceback.print_exc()
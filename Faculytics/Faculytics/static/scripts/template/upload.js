@@ -162,13 +162,17 @@ document.getElementById('uploadForm').addEventListener('submit', function (event
             }
             return response.json();
         })
+        .then(job => {
+            if (job.error) {
+                throw new Error(job.error);
+            }
+            // Analysis runs in the background, poll until the job finishes
+            return pollUploadJob(job.status_url);
+        })
         .then(data => {
             document.getElementById("loadingSpinner").classList.add("hidden");
-
-            if (data.error) {
-                alert(data.error);
-                return;
-            }
+            // A new analysis can be saved once
+            document.getElementById("saveResultsBtn").disabled = false;
 
             // Hide status indicators and show results
             checkIcon.classList.add('hidden');
@@ -187,8 +191,8 @@ document.getElementById('uploadForm').addEventListener('submit', function (event
             renderProcessedComments(data.processed_comments);
             renderTopWords(data.top_words);
             renderCategoryCounts(data.category_counts);
-            updateRecommendation(data);
-            console.log("Date Recommendation: ", data.recommendation);
+            // Generated in the background once the results are saved
+            updateRecommendation(data, "The recommendation will be generated after the results are saved.");
 
             console.log('File uploaded successfully:', data);
         })
@@ -198,10 +202,106 @@ document.getElementById('uploadForm').addEventListener('submit', function (event
             alert('Error processing file: ' + error.message);
         });
 });
+
+const UPLOAD_STAGE_LABELS = {
+    parse: "Reading CSV...",
+    sentiment: "Analyzing sentiment...",
+    topics: "Classifying topics..."
+};
+
+function pollUploadJob(statusUrl, interval = 2000) {
+    const processingText = document.querySelector("#loadingSpinner .processing-text");
+
+    return new Promise((resolve, reject) => {
+        const check = () => {
+            fetch(statusUrl)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`Server error ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(job => {
+                    if (job.status === "done") {
+                        if (processingText) processingText.textContent = "Processing...";
+                        resolve(job.result);
+                    } else if (job.status === "failed") {
+                        if (processingText) processingText.textContent = "Processing...";
+                        reject(new Error(job.error || "Upload analysis failed"));
+                    } else {
+                        if (processingText) {
+                            const rows = job.stages && job.stages[job.stage] ? job.stages[job.stage].rows : null;
+                            const label = UPLOAD_STAGE_LABELS[job.stage] || "Queued...";
+                            processingText.textContent = rows ? `${label} (${rows} comments)` : label;
+                        }
+                        setTimeout(check, interval);
+                    }
+                })
+                .catch(reject);
+        };
+        check();
+    });
+}
+function pollRecommendation(statusUrl, interval = 3000) {
+    return new Promise((resolve, reject) => {
+        const check = () => {
+            fetch(statusUrl)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`Server error ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(job => {
+                    if (job.status === "done") {
+                        resolve(job);
+                    } else if (job.status === "failed") {
+                        reject(new Error(job.error || "Recommendation failed"));
+                    } else {
+                        setTimeout(check, interval);
+                    }
+                })
+                .catch(reject);
+        };
+        check();
+    });
+}
+function followRecommendation(statusUrl, retryUrl) {
+    updateRecommendation({}, "Generating recommendation...");
+    return pollRecommendation(statusUrl)
+        .then(job => updateRecommendation(job))
+        .catch(error => {
+            console.error('Recommendation error:', error);
+            updateRecommendation({}, "The recommendation could not be generated.");
+
+            const recommendationContainer = document.getElementById('recommendationText');
+            if (!recommendationContainer || !retryUrl) {
+                return;
+            }
+            const retryButton = document.createElement("button");
+            retryButton.type = "button";
+            retryButton.className = "mt-2 text-sm text-blue-600 hover:underline";
+            retryButton.textContent = "Try again";
+            retryButton.addEventListener("click", () => {
+                fetch(retryUrl, { method: 'POST' })
+                    .then(response => {
+                        if (!response.ok) {
+                            throw new Error(`HTTP error! Status: ${response.status}`);
+                        }
+                        return followRecommendation(statusUrl, retryUrl);
+                    })
+                    .catch(error => {
+                        console.error('Retry error:', error);
+                        window.notifier.error("Recommendation", "Could not retry the recommendation");
+                    });
+            });
+            recommendationContainer.appendChild(retryButton);
+        });
+}
 /*
 Copy this or use this for analysis
 */
-function updateRecommendation(data) {
+function updateRecommendation(data, placeholder = "No recommendation available at the moment.") {
     const recommendationContainer = document.getElementById('recommendationText');
 
     if (!recommendationContainer) {
@@ -228,7 +328,7 @@ function updateRecommendation(data) {
         // Insert the formatted content into the container
         recommendationContainer.innerHTML = `<div class="leading-relaxed">${safeText}</div>`;
     } else {
-        recommendationContainer.innerHTML = `<p class="text-gray-400 italic">No recommendation available at the moment.</p>`;
+        recommendationContainer.innerHTML = `<p class="text-gray-400 italic">${placeholder}</p>`;
     }
 }
 let sentimentChart = null;
@@ -401,29 +501,16 @@ function toggleGridView() {
 }
 
 function saveResultsToDatabase() {
-    fetch('/upload', { method: 'GET' })
-        .then(response => {
-            if (!response.ok) {
-                throw new Error(`HTTP error! Status: ${response.status}`);
-            }
-            return response.json();
-        })
-        .then(data => {
-            console.log('Upload results:', data);
-
-            // Now, fetch /saveToDatabase with a POST request
-            return fetch('/saveToDatabase', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    filename: data.filename,
-                    comments: data.comments,
-                    sentiment: data.sentiment,
-                    recommendation: data.recommendation,
-                    teacherUName: teacherUName.value
-                })
-            });
-        })
+    const saveButton = document.getElementById("saveResultsBtn");
+    // Disabled while saving and for good once saved, so an upload is not stored twice
+    saveButton.disabled = true;
+
+    // The analyzed upload is staged on the server, only the teacher goes with the request
+    fetch('/saveToDatabase', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ teacherUName: teacherUName.value })
+    })
         .then(response => {
             if (!response.ok) {
                 throw new Error(`HTTP error! Status: ${response.status}`);
@@ -433,13 +520,13 @@ function saveResultsToDatabase() {
         .then(data => {
             console.log('Save results:', data);
             window.notifier.success("Save results", `Data saved successfully!`);
-            setTimeout(() => {
-                location.reload();
-            }, 1500); // Delay to allow the user to see the message
+            // The recommendation is written to the saved upload in the background
+            return followRecommendation(data.recommendation_status_url, data.recommendation_retry_url);
         })
         .catch(error => {
             console.error('Fetch error:', error);
             window.notifier.error("Fetch error", "Error saving")
+            saveButton.disabled = false;
         });
 }
 /*
@@ -2,18 +2,23 @@
 from datetime import datetime
 from flask import Flask, render_template, redirect, url_for, request, jsonify, session, flash, abort, make_response, send_file
 from functools import wraps
+import click
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from Faculytics import app, db
-from Faculytics.models import User, CSVUpload, College, Campus, UserApproval, Program
+from Faculytics.models import User, CSVUpload, College, Campus, UserApproval, Program, Comment
+from Faculytics.analytics import (
+    summarize_scope, page_comments, scope_teachers, scope_uploads, aggregate_uploads,
+    teacher_performance, load_upload_columns, topic_sentiment_buckets
+)
 import pandas as pd
 import json
 import os
+import time
 import traceback
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Query
-from sqlalchemy import and_
-import re
+from sqlalchemy import and_, text as sql_text
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, ListFlowable
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -25,34 +30,70 @@ from reportlab.platypus import ListFlowable
 from reportlab.platypus import Table, TableStyle
 from reportlab.lib.enums import TA_LEFT
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-from collections import defaultdict
 from weasyprint import HTML
 import io
 from io import BytesIO
+# Load environment variables from .env, before the model settings below are read
+load_dotenv()
+from Faculytics.recommendations import cached_recommendation, invalidate_recommendation, teacher_scope, uploads_fingerprint
+
 # ML libraries
-from transformers import pipeline
-from bertopic import BERTopic
-from sklearn.ensemble import RandomForestClassifier
 import matplotlib.pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap
 import matplotlib as mpl
 import numpy as np
 
-# MarkyBoyax Sentiment Analysis Model
-from Faculytics.src.SentimentAnalysis_functions import SentimentAnalyzer
-# Magax Topic Modeling Model
-from Faculytics.src.TopicModeling_functions import CommentProcessor
-sentiment_analyzer = SentimentAnalyzer()
-topic_modeling = CommentProcessor()
+# Per-comment cache of model outputs shared by both models
+from Faculytics.src.InferenceCache_functions import InferenceCache
+from Faculytics.src.UploadJobs_functions import UploadJobQueue, RECOMMENDATION_JOBS_DIR, RECOMMENDATION_STAGES
+from Faculytics.src.ResultStore_functions import UploadResultStore
+# Corpus-level BERTopic fitted offline, used for per-upload keywords
+from Faculytics.src.TopicCorpus_functions import CorpusTopicModel
+from Faculytics.src.ModelRegistry_functions import ModelRegistry, MODEL_WARMUP
+# Pinned local model snapshots, filled by `flask sync-models`
+from Faculytics.src.ModelStore_functions import ModelStore
+from Faculytics.src.StageGraph_functions import StageGraph
+from Faculytics.src.CommentDedup_functions import CommentDedup
+from Faculytics.src.LLMClient_functions import LLMClient, build_backend, LLM_BREAKER_RESET_SECONDS
+from Faculytics.src.PromptBuilder_functions import PromptBuilder, estimate_tokens, format_report
+from Faculytics.src.InferenceBackends_functions import export_onnx_model, ONNX_MODELS
+from Faculytics.src.InferenceServer_functions import (
+    InferenceServer, InferenceClient, RemoteSentimentAnalyzer, RemoteCommentProcessor, INFERENCE_SERVER_URL
+)
+inference_cache = InferenceCache()
+topic_corpus = CorpusTopicModel()
+model_store = ModelStore()
+
+def load_sentiment_analyzer():
+    # MarkyBoyax Sentiment Analysis Model
+    from Faculytics.src.SentimentAnalysis_functions import SentimentAnalyzer
+    return SentimentAnalyzer(cache=inference_cache, store=model_store)
+
+def load_topic_modeling():
+    # Magax Topic Modeling Model
+    from Faculytics.src.TopicModeling_functions import CommentProcessor
+    return CommentProcessor(cache=inference_cache, corpus_model=topic_corpus, store=model_store)
+
+# Models are built on first use (or by the warm-up thread), not at import
+local_models = ModelRegistry()
+local_models.register("sentiment", load_sentiment_analyzer)
+local_models.register("topics", load_topic_modeling)
+
+# With INFERENCE_SERVER_URL set, the models live in one `flask inference-server`
+# process shared by every web worker and this process only holds thin clients
+inference_client = InferenceClient(INFERENCE_SERVER_URL) if INFERENCE_SERVER_URL else None
+if inference_client:
+    model_registry = ModelRegistry()
+    model_registry.register("sentiment", lambda: RemoteSentimentAnalyzer(inference_client))
+    model_registry.register("topics", lambda: RemoteCommentProcessor(inference_client))
+else:
+    model_registry = local_models
+if MODEL_WARMUP:
+    model_registry.warm_up()
 
 # adviser: Mr. Neil A. Basabe
-# Load environment variables from .env
-# Activation for gemini
-load_dotenv()
-api_key = os.getenv("GOOGLE_API_KEY")
-gemini_client = genai.Client(api_key=api_key)
+# Activation for gemini; LLM_BACKEND=stub generates offline for load tests
+llm_client = LLMClient(build_backend())
 
 @app.route('/')
 def index():
@@ -803,26 +844,28 @@ def rename_program(campus_acronym, college_acronym):
 
     return redirect(url_for('college_page', college_acronym=college_acronym, campus_acronym=campus_acronym))
 
-def build_topic_comments_summary(processed_comments, sentiment_result, comments_list):
-    topic_examples = defaultdict(lambda: {"Positive": [], "Negative": []})
-    for idx, comment in enumerate(processed_comments):
-        topic = comment.get("Final_Topic")
-        sentiment = sentiment_result["predictions"][idx]
-        raw_comment = comments_list[idx]
-        if topic:
-            topic_examples[topic][sentiment].append(raw_comment)
-
-    # Build formatted summary block
-    summary_lines = []
-    for topic in topic_examples:
-        summary_lines.append(f"\nTopic: {topic}")
-        for sentiment_type in ["Positive", "Negative"]:
-            examples = topic_examples[topic][sentiment_type]
-            if examples:
-                summary_lines.append(f"{sentiment_type} Comments:")
-                for i, example in enumerate(examples[:5], 1):
-                    summary_lines.append(f"{i}. {example}")
-    return "\n".join(summary_lines)
+def topic_example_groups(topics, sentiments, comments_list):
+    """ {(topic, sentiment): comments} in order of first appearance, for PromptBuilder """
+    order = {}
+    groups = {}
+    for topic, sentiment, raw_comment in zip(topics, sentiments, comments_list):
+        if topic and sentiment in ("Positive", "Negative"):
+            order.setdefault(topic, len(order))
+            groups.setdefault((topic, sentiment), []).append(raw_comment)
+    # Each topic's positive examples right before its negative ones
+    return {key: groups[key] for key in sorted(groups, key=lambda key: (order[key[0]], key[1] != "Positive"))}
+
+def example_group_title(key):
+    topic, sentiment = key
+    return f"\nTopic: {topic} ({sentiment} comments)"
+
+def comment_embeddings(texts):
+    """ MiniLM vectors for picking prompt examples, mostly inference cache hits; None when no local model is loaded """
+    processor = model_registry.peek("topics")
+    if not hasattr(processor, "encode_comments"):
+        return None
+    cleaned = processor.preprocess_comments(pd.DataFrame({"comment": texts}))["cleaned_comment"].tolist()
+    return processor.encode_comments(cleaned)
 
 def generateRecommendation2(sentiment_result, comments_list, processed_comments, top_words, category_counts):
     try:
@@ -868,11 +911,13 @@ def generateRecommendation2(sentiment_result, comments_list, processed_comments,
             if neg > 0:
                 negative_summary.append(f"- {topic}: {neg} negative mentions")
 
-        # Topic-specific comment samples
-        topic_comments_summary = build_topic_comments_summary(processed_comments, sentiment_result, comments_list)
+        # Topic-specific comment samples, as many representative ones as the prompt budget allows
+        example_groups = topic_example_groups(
+            [comment.get("Final_Topic") for comment in processed_comments], sentiment_result["predictions"], comments_list
+        )
 
         # Final prompt
-        prompt = f"""Using the data provided below, generate a formal and concise teacher performance report.
+        prompt_head = f"""Using the data provided below, generate a formal and concise teacher performance report.
 
 FEEDBACK SUMMARY:
 Positive comments: {positive_count} | Negative comments: {negative_count}
@@ -885,7 +930,8 @@ AREAS FOR IMPROVEMENT:
 {chr(10).join(negative_summary)}
 
 TOPIC-SPECIFIC COMMENT EXAMPLES:
-{topic_comments_summary}
+"""
+        prompt_tail = """
 
 Structure your response as follows:
 
@@ -901,26 +947,26 @@ Guidelines:
 - Keep language concise and action-oriented.
 - Number all recommended actions clearly.
 """
+        prompt, prompt_report = PromptBuilder(embed=comment_embeddings).build(prompt_head, example_groups, prompt_tail, example_group_title)
 
         print(prompt)
+        app.logger.info(format_report("generateRecommendation2", prompt_report))
 
         # Generate recommendation using Gemini
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                system_instruction="You are an LLM-driven recommendation system. You are tasked to give accurate and specific recommendations especially on improving weaknesses.",
-                temperature=0.4
-            ),
+        recommendation_text = llm_client.generate(
+            prompt,
+            system_instruction="You are an LLM-driven recommendation system. You are tasked to give accurate and specific recommendations especially on improving weaknesses.",
+            temperature=0.4,
+            report=prompt_report
         )
-
-        recommendation_text = response.text.strip()
         print(recommendation_text)
         return recommendation_text
 
     except Exception as e:
         print(f"[generateRecommendation] Error: {str(e)}")
-        return "Failed to generate recommendation."
+        return RECOMMENDATION_FAILED
+
+RECOMMENDATION_FAILED = "Failed to generate recommendation."
 
 def generateRecommendation(sentiment_result, comments_list, processed_comments, top_words, category_counts):
     try:
@@ -960,14 +1006,18 @@ def generateRecommendation(sentiment_result, comments_list, processed_comments,
             if neg > 0:
                 negative_summary.append(f"- {topic}: {neg} negative mentions")
 
+        # Compact lines instead of the raw top_words/category_counts lists
+        top_words_line = ", ".join(str(word) for word, _ in top_words[:10])
+        category_line = "; ".join(f"{item['Category']} {item['Probability']:.0f}%" for item in category_counts)
+
         feedback_summary = (
             f"FEEDBACK SUMMARY:\n"
             f"Positive comments: {positive_count} | Negative comments: {negative_count}\n"
             f"Top topics: {', '.join(top_topics_list)}\n"
             f"Positive highlights:\n{chr(10).join(positive_summary)}\n"
             f"Areas for improvement:\n{chr(10).join(negative_summary)}\n"
-            f"Top words: {top_words}\n"
-            f"Category Counts: {category_counts}\n"
+            f"Top words: {top_words_line}\n"
+            f"Category shares: {category_line}\n"
         )
 
 
@@ -991,88 +1041,51 @@ def generateRecommendation(sentiment_result, comments_list, processed_comments,
         """
 
         print(prompt)
+        prompt_report = {"estimated_tokens": estimate_tokens(prompt)}
+        app.logger.info(f"[generateRecommendation] prompt ~{prompt_report['estimated_tokens']} tokens")
         # Generate the recommendation
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                system_instruction="You are an LLM-driven recommendation system. You are tasked to give accurate and specific recommendation especially on improving weaknesses",
-                temperature=0.4
-            ),
-
+        recommendation_text = llm_client.generate(
+            prompt,
+            system_instruction="You are an LLM-driven recommendation system. You are tasked to give accurate and specific recommendation especially on improving weaknesses",
+            temperature=0.4,
+            report=prompt_report
         )
-        recommendation_text = response.text.strip()
         print(recommendation_text)
         return recommendation_text
     except Exception as e:
         print(f"[generateRecommendation] Error: {str(e)}")
-        return "Failed to generate recommendation."
+        return RECOMMENDATION_FAILED
 
 def generateRecommendationAnalytics(file_data):
     try:
-        all_sentiments = []
-        all_topics = []
-        all_comments_with_topic = []
-
-        for file in file_data:
-            sentiments = file.get("sentiment", [])
-            topics = file.get("topics", [])
-            comments = file.get("comments", [])
-            filename = file.get("filename")
-
-            all_sentiments.extend(sentiments)
-            all_topics.extend(topics)
+        # Per-topic, per-sentiment comment buckets built in one pass over every semester
+        buckets, topic_totals, sentiment_totals = topic_sentiment_buckets(file_data)
 
-            # Associate each comment with its topic (assuming 1-to-1 correspondence)
-            for i, comment in enumerate(comments):
-                topic = topics[i] if i < len(topics) else None
-                all_comments_with_topic.append({"text": comment, "topic": topic})
+        positive_count = sentiment_totals["Positive"]
+        negative_count = sentiment_totals["Negative"]
 
-        positive_count = all_sentiments.count("Positive")
-        negative_count = all_sentiments.count("Negative")
-
-        predefined_topics = [
-            "Teaching Effectiveness", "Preparedness and Punctuality", "Fairness and Supportiveness", "Student Engagement",
-            "Professional Appearance", "Cleanliness and Classroom Management", "Teaching Quality",
-            "Availability and Communication", "Tardiness", "Assessment Fairness and Difficulty",
-            "Instructional Materials and Aids"
-        ]
-
-        topic_sentiment_summary = {topic: {"Positive": 0, "Negative": 0} for topic in predefined_topics}
-        for idx, comment_data in enumerate(all_comments_with_topic):
-            topic = comment_data.get("topic")
-            sentiment = all_sentiments[idx] if idx < len(all_sentiments) else None
-            if topic in topic_sentiment_summary and sentiment:
-                topic_sentiment_summary[topic][sentiment] += 1
-
-        topic_frequency = {}
-        for comment_data in all_comments_with_topic:
-            topic = comment_data.get("topic")
-            if topic:
-                topic_frequency[topic] = topic_frequency.get(topic, 0) + 1
-        top_topics = sorted(topic_frequency.items(), key=lambda x: x[1], reverse=True)[:5]
-        top_topics_list = [topic for topic, _ in top_topics]
+        # Ties keep the order in which topics first appear
+        top_topics_list = [topic for topic, _ in topic_totals.most_common(5)]
 
         positive_summary = []
         negative_summary = []
         for topic in top_topics_list:
-            pos = topic_sentiment_summary[topic]["Positive"]
-            neg = topic_sentiment_summary[topic]["Negative"]
+            bucket = buckets.get(topic, {"Positive": [], "Negative": []})
+            pos = len(bucket["Positive"])
+            neg = len(bucket["Negative"])
             if pos > 0:
                 positive_summary.append(f"- {topic}: {pos} positive mentions")
             if neg > 0:
                 negative_summary.append(f"- {topic}: {neg} negative mentions")
 
-        topic_comments_summary = ""
-        for topic in top_topics_list:
-            example_positive = next((c['text'] for i, c in enumerate(all_comments_with_topic) if c['topic'] == topic and (all_sentiments[i] if i < len(all_sentiments) else None) == 'Positive'), None)
-            example_negative = next((c['text'] for i, c in enumerate(all_comments_with_topic) if c['topic'] == topic and (all_sentiments[i] if i < len(all_sentiments) else None) == 'Negative'), None)
-            if example_positive:
-                topic_comments_summary += f"\n{topic} (Positive Example): {example_positive}"
-            if example_negative:
-                topic_comments_summary += f"\n{topic} (Negative Example): {example_negative}"
+        # Representative examples of the top topics, within the prompt budget
+        example_groups = {
+            (topic, sentiment): buckets[topic][sentiment]
+            for topic in top_topics_list if topic in buckets
+            for sentiment in ("Positive", "Negative") if buckets[topic][sentiment]
+        }
 
-        prompt = f"""Using the data provided below, generate a formal and concise teacher performance report.
+        prompt_head = f"""Using the data provided below, generate a formal and concise teacher performance report.
 
 FEEDBACK SUMMARY:
 Positive comments: {positive_count} | Negative comments: {negative_count}
@@ -1085,7 +1098,8 @@ AREAS FOR IMPROVEMENT:
 {chr(10).join(negative_summary)}
 
 TOPIC-SPECIFIC COMMENT EXAMPLES:
-{topic_comments_summary}
+"""
+        prompt_tail = """
 
 Structure your response as follows:
 
@@ -1101,26 +1115,246 @@ Guidelines:
 - Keep language concise and action-oriented.
 - Number all recommended actions clearly.
 """
+        builder = PromptBuilder(examples_per_group=2, embed=comment_embeddings)
+        prompt, prompt_report = builder.build(prompt_head, example_groups, prompt_tail, example_group_title)
 
         print(prompt)
+        app.logger.info(format_report("generateRecommendationAnalytics", prompt_report))
 
         # Generate recommendation using Gemini
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                system_instruction="You are an LLM-driven recommendation system. You are tasked to give accurate and specific recommendations especially on improving weaknesses.",
-                temperature=0.4
-            ),
+        recommendation_text = llm_client.generate(
+            prompt,
+            system_instruction="You are an LLM-driven recommendation system. You are tasked to give accurate and specific recommendations especially on improving weaknesses.",
+            temperature=0.4,
+            report=prompt_report
         )
-
-        recommendation_text = response.text.strip()
         print(recommendation_text)
         return recommendation_text
 
     except Exception as e:
         print(f"[generateRecommendationAnalytics] Error: {str(e)}")
-        return "Failed to generate analytics-based recommendation."
+        return RECOMMENDATION_ANALYTICS_FAILED
+
+RECOMMENDATION_ANALYTICS_FAILED = "Failed to generate analytics-based recommendation."
+
+# Rows read from an uploaded CSV per pipeline step; set UPLOAD_STREAMING=0 to read whole files
+UPLOAD_CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", 500))
+UPLOAD_STREAMING = os.getenv("UPLOAD_STREAMING", "1") == "1"
+
+def iter_comment_chunks(input_path, chunk_rows=UPLOAD_CHUNK_ROWS):
+    """ DataFrames of at most chunk_rows rows holding only the 'comment' column """
+    try:
+        for chunk in pd.read_csv(input_path, usecols=lambda column: column == "comment", chunksize=chunk_rows):
+            if 'comment' not in chunk.columns:
+                raise ValueError("CSV file missing required 'comment' column.")
+            yield chunk
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Error reading CSV: {str(e)}")
+
+def upload_stage_graph(sentiment_analyzer, topic_modeling, topic_stream):
+    """
+    Per-chunk stages over the distinct comments of the chunk: sentiment runs
+    alongside MiniLM embedding and topic classification, then the results are
+    scattered back to every row and folded into the topic aggregates.
+    """
+    graph = StageGraph(inputs=("dedup", "chunk", "cleaned"))
+    graph.add("sentiment", lambda r: sentiment_analyzer.predict(r["dedup"].unique, output="confidence"), after=["dedup"])
+    graph.add("embedding", lambda r: topic_modeling.encode_comments(r["dedup"].take(r["cleaned"])), after=["dedup", "cleaned"])
+    if topic_modeling.classification_uses_embeddings:
+        graph.add(
+            "classification",
+            lambda r: topic_modeling.classify_comments(r["dedup"].take(r["cleaned"]), r["embedding"]),
+            after=["dedup", "cleaned", "embedding"]
+        )
+    else:
+        graph.add("classification", lambda r: topic_modeling.classify_comments(r["dedup"].take(r["cleaned"])), after=["dedup", "cleaned"])
+    graph.add(
+        "topics",
+        lambda r: topic_stream.collect(
+            r["chunk"],
+            r["cleaned"],
+            r["dedup"].scatter(r["embedding"]),
+            tuple(r["dedup"].scatter(values) for values in r["classification"])
+        ),
+        after=["dedup", "chunk", "cleaned", "embedding", "classification"]
+    )
+    return graph
+
+def analyze_comments_streaming(input_path, sentiment_analyzer, topic_modeling, progress):
+    """
+    Sentiment and topic classification chunk by chunk, so only one chunk of rows
+    and its embeddings are in memory besides the compact per-comment results.
+    Models run once per distinct comment of a chunk; repeats across chunks are
+    answered by the inference cache.
+    """
+    topic_stream = topic_modeling.stream()
+    graph = upload_stage_graph(sentiment_analyzer, topic_modeling, topic_stream)
+    comments_list = []
+    sentiment_result = {"predictions": [], "confidence": []}
+    processed_comments = []
+    distinct = set()
+
+    progress("sentiment", rows=0)
+    with graph.executor() as executor:
+        for chunk in iter_comment_chunks(input_path):
+            comments = chunk['comment'].tolist()
+            dedup = CommentDedup(comments)
+            results = graph.run(executor, dedup=dedup, chunk=chunk, cleaned=topic_stream.prepare(chunk))
+            for key in ("predictions", "confidence"):
+                sentiment_result[key].extend(dedup.scatter(results["sentiment"][key]))
+            processed_comments.extend(results["topics"])
+            comments_list.extend(comments)
+            distinct.update(dedup.keys)
+            progress("sentiment", rows=len(comments_list))
+
+    if not comments_list:
+        raise ValueError("CSV file has no comments.")
+
+    progress("topics")
+    started = time.perf_counter()
+    top_words, category_counts = topic_stream.finish()
+    return {
+        "comments": comments_list,
+        "sentiment": sentiment_result,
+        "processed_comments": processed_comments,
+        "top_words": top_words,
+        "category_counts": category_counts,
+        "topic_model_version": topic_stream.topic_model_version,
+        "stage_seconds": dict(graph.report(), keywords=round(time.perf_counter() - started, 3)),
+        "dedup": {
+            "rows": len(comments_list),
+            "unique": len(distinct),
+            "ratio": round(1 - len(distinct) / len(comments_list), 4)
+        }
+    }
+
+def analyze_comments(input_path, sentiment_analyzer, topic_modeling, progress):
+    """ Whole-file analysis, for UPLOAD_STREAMING=0 and the inference server proxies """
+    try:
+        df = pd.read_csv(input_path)
+    except Exception as e:
+        raise ValueError(f"Error reading CSV: {str(e)}")
+
+    if 'comment' not in df.columns:
+        raise ValueError("CSV file missing required 'comment' column.")
+
+    # Convert comments to JSON format
+    comments_list = df['comment'].tolist()
+    dedup = CommentDedup(comments_list)
+
+    # Sentiment and topics are independent, so they run side by side
+    progress("sentiment")
+    graph = StageGraph()
+    # Only labels and their confidence are used downstream, computed once per distinct comment
+    graph.add("sentiment", lambda r: sentiment_analyzer.predict(dedup.unique, output="confidence"))
+    # process_comments deduplicates the cleaned comments itself
+    graph.add("topics", lambda r: topic_modeling.process_comments(df))
+    results = graph.run()
+    processed_comments, top_words, category_counts, topic_model_version = results["topics"]
+
+    return {
+        "comments": comments_list,
+        "sentiment": {key: dedup.scatter(values) for key, values in results["sentiment"].items()},
+        "processed_comments": processed_comments,
+        "top_words": top_words,
+        "category_counts": category_counts,
+        "topic_model_version": topic_model_version,
+        "stage_seconds": graph.report(),
+        "dedup": dedup.stats()
+    }
+
+def run_upload_pipeline(params, input_path, progress):
+    """ Full analysis of one uploaded CSV, executed by the upload job workers """
+    progress("parse")
+    sentiment_analyzer = model_registry.get("sentiment")
+    topic_modeling = model_registry.get("topics")
+
+    if UPLOAD_STREAMING and hasattr(topic_modeling, "stream"):
+        analysis = analyze_comments_streaming(input_path, sentiment_analyzer, topic_modeling, progress)
+    else:
+        analysis = analyze_comments(input_path, sentiment_analyzer, topic_modeling, progress)
+    comments_list = analysis["comments"]
+    sentiment_result = analysis["sentiment"]
+    processed_comments = analysis["processed_comments"]
+    top_words = analysis["top_words"]
+    category_counts = analysis["category_counts"]
+    print(f"Upload dedup: {analysis['dedup']['unique']} distinct of {analysis['dedup']['rows']} comments")
+
+    # The Gemini recommendation is generated after the upload is saved, see run_recommendation_job
+
+    # set new filename
+    new_filename = f"{params['starting_year']}_{params['ending_year']}_{params['semester']}.csv"
+
+    return {
+        "filename": new_filename,
+        "sentiment": sentiment_result["predictions"],
+        "comments": comments_list,
+        "processed_comments": processed_comments,
+        "top_words": top_words,
+        "category_counts": category_counts,
+        "topics": [item["Final_Topic"] for item in processed_comments],
+        "sentiment_probabilities": sentiment_result["confidence"],
+        "topic_probabilities": [item["Topic_Probability"] for item in processed_comments],
+        "topic_model_version": analysis["topic_model_version"],
+        "stage_seconds": analysis["stage_seconds"],
+        "dedup": analysis["dedup"],
+        "teacherUName": params["teacherUName"],
+        "grade": params["grade"]
+    }
+
+# Background workers for /upload, jobs interrupted by a restart are picked up again
+upload_jobs = UploadJobQueue(run_upload_pipeline)
+upload_jobs.resume_pending()
+# Finished results wait here for /saveToDatabase, the session only carries the token
+upload_results = UploadResultStore()
+
+def run_recommendation_job(params, input_path, progress):
+    """ Generate the recommendation of a saved upload and store it in CSVUpload.recommendation """
+    progress("recommendation")
+    with open(input_path, "r", encoding="utf-8") as f:
+        inputs = json.load(f)
+
+    recommendation_text = generateRecommendation2(
+        {"predictions": inputs["sentiment"]},
+        inputs["comments"],
+        inputs["processed_comments"],
+        inputs["top_words"],
+        inputs["category_counts"]
+    )
+    if recommendation_text == RECOMMENDATION_FAILED:
+        # Raised so the job queue retries it
+        raise RuntimeError(RECOMMENDATION_FAILED)
+
+    with app.app_context():
+        upload = CSVUpload.query.get(params["upload_id"])
+        if upload is None:
+            raise ValueError("Upload no longer exists")
+        upload.recommendation = recommendation_text
+        db.session.commit()
+    return {"upload_id": params["upload_id"], "recommendation": recommendation_text}
+
+def mark_recommendation_failed(params, error):
+    """ Give up on an upload's recommendation, so it does not stay empty; /recommendation/retry can still fill it in """
+    with app.app_context():
+        upload = CSVUpload.query.get(params["upload_id"])
+        if upload is not None and not upload.recommendation:
+            upload.recommendation = RECOMMENDATION_FAILED
+            db.session.commit()
+
+# Recommendations run after /saveToDatabase, so the upload itself never waits on Gemini
+recommendation_jobs = UploadJobQueue(
+    run_recommendation_job,
+    jobs_dir=RECOMMENDATION_JOBS_DIR,
+    stages=RECOMMENDATION_STAGES,
+    name="recommendation-job",
+    input_suffix=".json",
+    on_failure=mark_recommendation_failed,
+    # The first retry waits out an open LLM circuit breaker
+    retry_delay=LLM_BREAKER_RESET_SECONDS
+)
+recommendation_jobs.resume_pending()
 
 @app.route('/upload', methods=['GET', 'POST'])
 def upload_file():
@@ -1151,63 +1385,24 @@ def upload_file():
 
             if file.filename == '':
                 return jsonify({"error": "No selected file"}), 400
-            try:
-                df = pd.read_csv(file)
-            except Exception as e:
-                return jsonify({"error": f"Error reading CSV: {str(e)}"}), 400
-
-            if 'comment' not in df.columns:
-                return jsonify({"error": "CSV file missing required 'comment' column."}), 400
-
-            # Convert comments to JSON format
-            comments_list = df['comment'].tolist()
-
-            # --- Sentiment Analysis ---
-            sentiment_result = sentiment_analyzer.predict(comments_list)
-
-            # Count positive and negative sentiments
-            neg_count = sentiment_result["predictions"].count("Negative")
-            pos_count = sentiment_result["predictions"].count("Positive")
-
-            #  Process comments using CommentProcessor
-            processed_comments, top_words, category_counts = topic_modeling.process_comments(df)
 
-            # Recommendation text using GEMINI
-            recommendation_text = generateRecommendation2(sentiment_result, comments_list, processed_comments, top_words, category_counts);
-
-            # set new filename
-            new_filename = f"{starting_year}_{ending_year}_{semester}.csv"
-
-            # Return response
-            session["upload_results"] = {
-                "filename": new_filename,
-                "sentiment": sentiment_result["predictions"],
-                "comments": comments_list,
-                "processed_comments": processed_comments,
-                "top_words": top_words,
-                "category_counts": category_counts,
-                "topics": [item["Final_Topic"] for item in processed_comments],
-                "recommendation": recommendation_text,
-                "teacherUName": teacherUName,
-                "grade": grade
-            }
-            print(session.get('upload_results', {}));
-            results = {
-                "filename": new_filename,
-                "sentiment": sentiment_result["predictions"],
-                "comments": comments_list,
-                "processed_comments": processed_comments,
-                "top_words": top_words,
-                "category_counts": category_counts,
-                "topics": [item["Final_Topic"] for item in processed_comments],
-                "recommendation": recommendation_text,
+            # Analysis runs in the background, the client polls /upload/status/<job_id>
+            job_id = upload_jobs.submit({
                 "teacherUName": teacherUName,
-                "grade": grade
-            }
-            return jsonify(results), 200
+                "starting_year": starting_year,
+                "ending_year": ending_year,
+                "semester": semester,
+                "grade": grade,
+                "user_id": session.get("user_id")
+            }, file.read())
+
+            return jsonify({
+                "job_id": job_id,
+                "status_url": url_for('upload_status', job_id=job_id)
+            }), 202
 
         elif request.method == 'GET':
-            results = session.get('upload_results', {});
+            results = upload_results.get(session.get('upload_token')) or {}
             return jsonify(results), 200
 
         return render_template('upload.html')
@@ -1217,12 +1412,145 @@ def upload_file():
         traceback.print_exc()
         return jsonify({"error": f"Error processing file: {str(e)}"}), 500
 
+@app.route('/upload/status/<string:job_id>', methods=['GET'])
+def upload_status(job_id):
+    job = upload_jobs.get(job_id)
+    if not job or job["params"].get("user_id") != session.get("user_id"):
+        return jsonify({"error": "Job not found"}), 404
+
+    response = {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "stages": job["stages"],
+        "attempts": job["attempts"],
+        "error": job["error"]
+    }
+
+    if job["status"] == "done" and session.get("saved_upload_job") != job_id:
+        # Stage the finished result for /saveToDatabase, once per job
+        if session.get("upload_job") != job_id or not upload_results.exists(session.get("upload_token")):
+            session["upload_token"] = upload_results.put(job["result"])
+            session["upload_job"] = job_id
+        response["result"] = job["result"]
+
+    return jsonify(response), 200
+
+@app.route('/upload/retry/<string:job_id>', methods=['POST'])
+def upload_retry(job_id):
+    job = upload_jobs.get(job_id)
+    if not job or job["params"].get("user_id") != session.get("user_id"):
+        return jsonify({"error": "Job not found"}), 404
+
+    if not upload_jobs.retry(job_id):
+        return jsonify({"error": f"Job is {job['status']}, only failed jobs can be retried"}), 409
+
+    return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+@app.route('/recommendation/status/<string:job_id>', methods=['GET'])
+def recommendation_status(job_id):
+    job = recommendation_jobs.get(job_id)
+    if not job or job["params"].get("user_id") != session.get("user_id"):
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify({
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "upload_id": job["params"]["upload_id"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "recommendation": job["result"]["recommendation"] if job["status"] == "done" else None,
+        "retry_url": url_for('recommendation_retry', job_id=job_id) if job["status"] == "failed" else None
+    }), 200
+
+@app.route('/recommendation/retry/<string:job_id>', methods=['POST'])
+def recommendation_retry(job_id):
+    job = recommendation_jobs.get(job_id)
+    if not job or job["params"].get("user_id") != session.get("user_id"):
+        return jsonify({"error": "Job not found"}), 404
+
+    if not recommendation_jobs.retry(job_id):
+        return jsonify({"error": f"Job is {job['status']}, only failed jobs can be retried"}), 409
+
+    return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+@app.route('/inference_cache/stats', methods=['GET'])
+def inference_cache_stats():
+    # Hit rate and size of the per-comment inference cache, used for sizing
+    return jsonify(inference_cache.stats()), 200
+
+@app.route('/llm/stats', methods=['GET'])
+def llm_stats():
+    # Outcomes, latency and token usage of recommendation calls, plus the circuit breaker state
+    return jsonify(llm_client.stats()), 200
+
+@app.route('/health', methods=['GET'])
+def health():
+    # Liveness plus per-model load state; the app serves non-ML routes while models load
+    ready, models = model_readiness()
+    return jsonify({
+        "status": "ok",
+        "models_ready": ready,
+        "models": models
+    }), 200
+
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    # Readiness for uploads: 503 until every model has loaded
+    ready, models = model_readiness()
+    return jsonify({"ready": ready, "models": models}), 200 if ready else 503
+
+def model_readiness():
+    """ (ready, per-model status) of whichever process owns the models """
+    if not inference_client:
+        return model_registry.is_ready(), model_registry.status()
+    try:
+        server_health = inference_client.health()
+    except Exception as e:
+        return False, {"inference_server": {"state": "unreachable", "error": str(e)}}
+    return server_health["ready"], server_health["models"]
+
+@app.route('/inference_batching/stats', methods=['GET'])
+def inference_batching_stats():
+    # Batch fill ratio and queue wait of the sentiment batch scheduler, for tuning SENTIMENT_BATCH_*
+    if inference_client:
+        return jsonify(inference_client.stats()["sentiment_batching"]), 200
+    scheduler = getattr(model_registry.peek("sentiment"), "scheduler", None)
+    return jsonify(scheduler.stats() if scheduler else None), 200
+
+@app.route('/topic_model/status', methods=['GET'])
+def topic_model_status():
+    # Which corpus topic model version uploads are using, and the versions kept on disk
+    topic_modeling = model_registry.peek("topics")
+    return jsonify({
+        "mode": topic_modeling.topic_model_mode if topic_modeling else None,
+        "uses_corpus_model": topic_modeling.uses_corpus_model if topic_modeling else None,
+        "current_version": topic_corpus.current_version(),
+        "versions": topic_corpus.versions()
+    }), 200
+
+def build_comment_rows(upload_id, comments, sentiments, topics, probabilities=None, topic_probabilities=None):
+    """ Mappings for bulk inserting an upload's comments into the Comments table """
+    rows = []
+    for idx, text in enumerate(comments):
+        rows.append({
+            "upload_id": upload_id,
+            "ordinal": idx,
+            "text": str(text),
+            "sentiment": sentiments[idx] if sentiments and idx < len(sentiments) else None,
+            "probability": probabilities[idx] if probabilities and idx < len(probabilities) else None,
+            "topic": topics[idx] if topics and idx < len(topics) else None,
+            "topic_probability": topic_probabilities[idx] if topic_probabilities and idx < len(topic_probabilities) else None
+        })
+    return rows
+
 @app.route('/saveToDatabase', methods=['POST'])
 def saveToDatabase():
     try:
-        # Retrieve stored session data
-        stored_results = session.get("upload_results", {})
-        print("# Retrieve stored session data");
+        # Retrieve the staged upload result referenced by the session
+        upload_token = session.get("upload_token")
+        stored_results = upload_results.get(upload_token) or {}
+        print("# Retrieve staged upload results");
 
         if not stored_results:
             return jsonify({"error": "No data received!"}), 400
@@ -1231,52 +1559,58 @@ def saveToDatabase():
         comments_list = stored_results.get("comments")
         sentiment_result = stored_results.get("sentiment")
         topic_result = stored_results.get("topics")
-        recommendation_text = stored_results.get("recommendation")
         teacherUName = stored_results.get("teacherUName")
         grade = stored_results.get("grade")
         print("# Storing data");
 
-        if not comments_list or not sentiment_result or not recommendation_text or not teacherUName:
+        if not comments_list or not sentiment_result or not teacherUName:
             return jsonify({"error": "Missing required fields"}), 400
 
-        # Check row count limit
-        max_allowed_rows = 1500
-        if len(comments_list) > max_allowed_rows:
-            return jsonify({"error": "Data rows exceed 1500 limit"}), 400
-
-        # Helper function to split into chunks of 500
-        def split_chunks(lst, size):
-            return [lst[i:i + size] for i in range(0, len(lst), size)]
-
-        print("Comments Chunk");
-        comments_chunks = split_chunks(comments_list, 500)
-        print("Sentiment Chunk");
-        sentiment_chunks = split_chunks(sentiment_result, 500)
-        print("Topic Chunk");
-        topics_chunks = split_chunks(topic_result, 500)
-
-        # Prepare field data
-        upload_data = {
-            "filename": filename,
-            "recommendation": recommendation_text,
-            "teacher_uname": teacherUName,
-            "grade": grade
-        }
-
-        # Map chunks to dynamic column names (up to 3)
-        for i in range(len(comments_chunks)):
-            idx = i + 1
-            upload_data[f"comments{idx}"] = comments_chunks[i]
-            upload_data[f"sentiment{idx}"] = sentiment_chunks[i]
-            upload_data[f"topics{idx}"] = topics_chunks[i]
-        print("# Map Chunking");
-        # Create CSVUpload instance dynamically with only the fields present
-        upload_record = CSVUpload(**upload_data)
-
+        upload_record = CSVUpload(
+            filename=filename,
+            recommendation="",  # Filled in by the recommendation job queued below
+            teacher_uname=teacherUName,
+            grade=grade
+        )
         db.session.add(upload_record)
+        db.session.flush()  # Assigns upload_id for the comment rows
+
+        # One row per comment, inserted in a single bulk statement
+        db.session.bulk_insert_mappings(Comment, build_comment_rows(
+            upload_record.upload_id,
+            comments_list,
+            sentiment_result,
+            topic_result,
+            stored_results.get("sentiment_probabilities"),
+            stored_results.get("topic_probabilities")
+        ))
         db.session.commit()
+        # A staged result is saved once; /upload/status does not stage a saved job again
+        upload_results.delete(upload_token)
+        session["saved_upload_job"] = session.pop("upload_job", None)
+        session.pop("upload_token", None)
+        # The teacher's overall recommendation no longer covers every upload
+        invalidate_recommendation(teacher_scope(teacherUName))
+
+        job_id = recommendation_jobs.submit(
+            {"upload_id": upload_record.upload_id, "user_id": session.get("user_id")},
+            json.dumps({
+                "sentiment": sentiment_result,
+                "comments": comments_list,
+                "processed_comments": stored_results.get("processed_comments"),
+                "top_words": stored_results.get("top_words"),
+                "category_counts": stored_results.get("category_counts")
+            }).encode("utf-8")
+        )
 
-        return jsonify({"success": True, "message": "Data saved successfully!"}), 200
+        return jsonify({
+            "success": True,
+            "message": "Data saved successfully!",
+            "upload_id": upload_record.upload_id,
+            "recommendation_job_id": job_id,
+            "recommendation_status_url": url_for('recommendation_status', job_id=job_id),
+            "recommendation_retry_url": url_for('recommendation_retry', job_id=job_id)
+        }), 200
 
     except Exception as e:
         db.session.rollback()
@@ -1284,15 +1618,84 @@ def saveToDatabase():
         traceback.print_exc()
         return jsonify({"error": f"Database error: {str(e)}"}), 500
 
-def extract_json_chunks(prefix, upload):
-    chunks = []
-    for attr in dir(upload):
-        if re.match(f"{prefix}\\d+", attr):
-            chunk = getattr(upload, attr)
-            if chunk:
-                parsed = json.loads(chunk) if isinstance(chunk, str) else chunk
-                chunks.extend(parsed)
-    return chunks
+@app.cli.command('backfill-comments')
+def backfill_comments():
+    """ Migration: create the Comments and RecommendationCache tables and copy legacy chunk columns into Comments """
+    db.create_all()
+
+    # New uploads leave the legacy chunk columns empty
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(sql_text('ALTER TABLE "Uploads" ALTER COLUMN comments1 DROP NOT NULL'))
+        db.session.execute(sql_text('ALTER TABLE "Uploads" ALTER COLUMN sentiment1 DROP NOT NULL'))
+        db.session.commit()
+
+    migrated_ids = db.session.query(Comment.upload_id).distinct()
+    pending = CSVUpload.query.filter(~CSVUpload.upload_id.in_(migrated_ids)).all()
+
+    total_rows = 0
+    for upload in pending:
+        comments = upload.chunk_items('comments')
+        sentiments = upload.chunk_items('sentiment')
+        topics = upload.chunk_items('topics')
+        rows = build_comment_rows(upload.upload_id, comments, sentiments, topics)
+        db.session.bulk_insert_mappings(Comment, rows)
+        db.session.commit()
+        total_rows += len(rows)
+        print(f"Backfilled upload {upload.upload_id} ({upload.filename}): {len(rows)} comments")
+
+    print(f"Backfilled {len(pending)} uploads, {total_rows} comments.")
+
+def refit_topic_model(limit=None):
+    """ Fit a new corpus topic model version over the stored comments """
+    with app.app_context():
+        query = db.session.query(Comment.text).order_by(Comment.comment_id.desc())
+        if limit:
+            query = query.limit(limit)
+        comments = [row.text for row in query]
+    return model_registry.get("topics").fit_corpus_model(comments)
+
+@app.cli.command('refit-topic-model')
+@click.option('--limit', type=int, default=None, help='Only use the most recent N comments.')
+def refit_topic_model_command(limit):
+    """ Fit and activate a new corpus topic model version, meant to run on a schedule (cron) """
+    try:
+        version = refit_topic_model(limit)
+    except ValueError as e:
+        print(f"Topic model not refitted: {e}")
+        return
+    print(f"Topic model version {version} is now current.")
+
+@app.cli.command('inference-server')
+@click.option('--url', default=None, help='unix:///path.sock or http://127.0.0.1:PORT, defaults to INFERENCE_SERVER_URL.')
+def inference_server_command(url):
+    """ Run the shared model process the web workers call when INFERENCE_SERVER_URL is set """
+    url = url or INFERENCE_SERVER_URL
+    if not url:
+        print("Set INFERENCE_SERVER_URL or pass --url.")
+        return
+    local_models.warm_up()
+    InferenceServer(local_models, url).serve_forever()
+
+@app.cli.command('export-onnx')
+@click.argument('names', nargs=-1)
+def export_onnx_command(names):
+    """ Export the sentiment model and MiniLM encoder to ONNX for INFERENCE_BACKEND=onnx """
+    for name in names or ONNX_MODELS:
+        source, revision = model_store.resolve(name)
+        path = export_onnx_model(name, source, revision, token=os.getenv("HF_TOKEN"))
+        print(f"{name}: exported to {path}")
+
+@app.cli.command('sync-models')
+@click.argument('names', nargs=-1)
+def sync_models_command(names):
+    """ Download the models in model_manifest.json into the local store and lock their commits in model_manifest.lock.json """
+    for name in names or model_store.manifest.keys():
+        path = model_store.sync(name)
+        print(f"{name}: {model_store.entry(name)['revision']} -> {path}")
+
+# Optional in-process refit schedule, in seconds (0 disables it; use cron with the command above instead)
+TOPIC_MODEL_REFIT_INTERVAL = int(os.getenv("TOPIC_MODEL_REFIT_INTERVAL", 0))
+topic_corpus.schedule_refit(TOPIC_MODEL_REFIT_INTERVAL, refit_topic_model)
 
 def calculate_grade_value(grade_range_str):
     """Calculates the numerical grade value from a grade range string."""
@@ -1319,16 +1722,6 @@ def get_grade_equivalent(grade_value):
     else:
         return "N/A"
 
-def extract_json_chunks(prefix, upload):
-    chunks = []
-    for attr in dir(upload):
-        if re.match(f"{prefix}\\d+", attr):
-            chunk = getattr(upload, attr)
-            if chunk:
-                parsed = json.loads(chunk) if isinstance(chunk, str) else chunk
-                chunks.extend(parsed)
-    return chunks
-
 @app.route('/analysis', methods=['GET'])
 def analysis():
 
@@ -1340,32 +1733,21 @@ def analysis():
         return jsonify({"error": "Missing teacher username"}), 400
 
     # Retrieve the uploads for the teacher
-    uploads = CSVUpload.query.filter_by(teacher_uname=teacherUName).all()
+    uploads = scope_uploads([teacherUName])
 
     if not uploads:
         return jsonify({"error": "No uploads found for this teacher."}), 404
 
     # Initialize
     file_data = []
+    file_counts = []
     total_positive = 0
     total_negative = 0
     overall_grade_value_sum = 0
     valid_grade_count = 0
 
     for upload in uploads:
-        def extract_json_chunks(prefix, upload):
-            chunks = []
-            for attr in dir(upload):
-                if re.match(f"{prefix}\\d+", attr):
-                    chunk = getattr(upload, attr)
-                    if chunk:
-                        parsed = json.loads(chunk) if isinstance(chunk, str) else chunk
-                        chunks.extend(parsed)
-            return chunks
-
-        sentiments = extract_json_chunks('sentiment', upload)
-        topics = extract_json_chunks('topics', upload)
-        comments = extract_json_chunks('comments', upload)
+        comments, sentiments, topics = load_upload_columns(upload)
         grade_range = upload.grade
         recommendation_text_db = upload.recommendation
 
@@ -1381,23 +1763,32 @@ def analysis():
             "comments": comments,
             "recommendation": recommendation_text_db
         })
+        file_counts.append((upload.upload_id, len(comments)))
 
         total_positive += sentiments.count("Positive")
         total_negative += sentiments.count("Negative")
 
     overall_recommendations = ""
+    recommendation_status = None
     overall_grade_word = "N/A"
 
     if include_recommendations and file_name == "overall":
-        overall_recommendations = generateRecommendationAnalytics(file_data)
+        def generate():
+            text = generateRecommendationAnalytics(file_data)
+            return None if text == RECOMMENDATION_ANALYTICS_FAILED else text
+
+        # Regenerated only when the teacher's uploads or the prompt changed
+        overall_recommendations, recommendation_status = cached_recommendation(teacher_scope(teacherUName), uploads_fingerprint(file_counts), generate)
+        overall_recommendations = overall_recommendations or RECOMMENDATION_ANALYTICS_FAILED
 
     # Find specific file if needed
     if file_name != "overall":
         target_upload = next((u for u in uploads if u.filename == file_name), None)
         if not target_upload:
             return jsonify({"error": "File not found"}), 404
-        positive_count = target_upload.sentiment_part1.count("Positive") + (json.loads(target_upload.sentiment_part2).count("Positive") if target_upload.sentiment_part2 else 0) + (json.loads(target_upload.sentiment_part3).count("Positive") if target_upload.sentiment_part3 else 0)
-        negative_count = target_upload.sentiment_part1.count("Negative") + (json.loads(target_upload.sentiment_part2).count("Negative") if target_upload.sentiment_part2 else 0) + (json.loads(target_upload.sentiment_part3).count("Negative") if target_upload.sentiment_part3 else 0)
+        target_sentiments = load_upload_columns(target_upload)[1]
+        positive_count = target_sentiments.count("Positive")
+        negative_count = target_sentiments.count("Negative")
         recommendation_text = target_upload.recommendation
         grade_value = calculate_grade_value(target_upload.grade)
         overall_grade_display = get_grade_equivalent(grade_value)
@@ -1412,7 +1803,8 @@ def analysis():
         "files": file_data,
         "positive": positive_count,
         "negative": negative_count,
-        "recommendation": recommendation_text
+        "recommendation": recommendation_text,
+        "recommendation_status": recommendation_status
     }), 200
 
 @app.route('/college_analysis', methods=['GET'])
@@ -1433,176 +1825,39 @@ def college_analysis():
             return jsonify({"error": "Campus, College, or Program not found."}), 404
 
         # Fetch teachers in this specific campus, college, and program
-        teachers = User.query.filter_by(
-            campus_acronym=campus_acronym,
-            college_name=college.college_name,
-            program_acronym=program_acronym,
-            userType="Teacher",
-            isDeleted=False
-        ).all()
+        teachers = scope_teachers("program", campus_acronym, college.college_name, program_acronym)
 
         if not teachers:
             return jsonify({"error": "No teachers found for this program."}), 404
 
+        # Counts-only payload aggregated in SQL, raw comments are paged via /analytics_comments
+        if request.args.get("view") == "counts":
+            summary = summarize_scope([t.uName for t in teachers])
+            summary["total_teachers"] = len(teachers)
+            return jsonify(summary), 200
+
         # Fetch their uploads
-        uploads = CSVUpload.query.filter(
-            CSVUpload.teacher_uname.in_([t.uName for t in teachers])
-        ).all()
+        uploads = scope_uploads([t.uName for t in teachers])
 
         if not uploads:
             return jsonify({"error": "No uploaded sentiment data found for this program."}), 404
 
-        import re, json
-        def extract_json_chunks(prefix, upload):
-            chunks = []
-            for attr in dir(upload):
-                if re.match(f"{prefix}\\d+", attr):
-                    chunk = getattr(upload, attr)
-                    if chunk is None:
-                        continue
-                    if isinstance(chunk, list):
-                        chunks.extend(chunk)
-                    elif isinstance(chunk, str):
-                        try:
-                            parsed = json.loads(chunk)
-                            if isinstance(parsed, (list, dict)):
-                                chunks.extend(parsed if isinstance(parsed, list) else [parsed])
-                        except json.JSONDecodeError:
-                            continue
-                    elif isinstance(chunk, dict):
-                        chunks.append(chunk)
-            print(f"Extracted {prefix} chunks: {chunks}")  # Debugging line
-            return chunks
-
-        file_data = {}
-
-        for upload in sorted(uploads, key=lambda x: x.upload_date):
-            comments_chunks = extract_json_chunks('comments', upload)
-            sentiment_chunks = extract_json_chunks('sentiment', upload)
-            topics_chunks = extract_json_chunks('topics', upload)
-
-            if upload.filename not in file_data:
-                file_data[upload.filename] = {
-                    "filename": upload.filename,
-                    "sentiment": [],
-                    "topics": [],
-                    "comments": []
-                }
-
-            file_data[upload.filename]["sentiment"].extend(sentiment_chunks)
-            file_data[upload.filename]["topics"].extend(topics_chunks)
-            file_data[upload.filename]["comments"].extend(comments_chunks)
-
-        def sort_key(filename):
-            try:
-                start, end, sem = map(int, filename.split('_'))
-                return (start, end, sem)
-            except:
-                return (9999, 9999, 9)
-
-        sorted_file_data = [file_data[f] for f in sorted(file_data.keys(), key=sort_key)]
-
-        all_sentiments = []
-        all_topics = []
-        all_comments = []
-
-        # Processing each file entry to extract sentiments, topics, and comments
-        for file_entry in sorted_file_data:
-            sentiments = file_entry.get("sentiment", [])
-            topics = file_entry.get("topics", [])
-            comments = file_entry.get("comments", [])
-
-            # Debugging the raw extracted data for sentiments, topics, and comments
-            print(f"Processing file: {file_entry['filename']}")
-            print(f"Sentiments: {sentiments}")
-            print(f"Topics: {topics}")
-            print(f"Comments: {comments}")
-
-            # Handling sentiment entries
-            for sentiment_entry in sentiments:
-                all_sentiments.append({
-                    "filename": file_entry["filename"],
-                    "sentiment_score": sentiment_entry
-                })
-
-            # Handling topic entries correctly
-            for idx, topic_entry in enumerate(topics):
-                corresponding_sentiment = sentiments[idx] if idx < len(sentiments) else "Unknown"
-
-                if isinstance(topic_entry, dict):
-                    topic = topic_entry.get("topic")
-                    sentiment = topic_entry.get("sentiment", corresponding_sentiment)
-                    if topic is not None and sentiment is not None:
-                        all_topics.append({
-                            "topic": topic,
-                            "sentiment": sentiment
-                        })
-                else:  # If it's a string, handle accordingly
-                    all_topics.append({
-                        "topic": topic_entry,
-                        "sentiment": corresponding_sentiment
-                    })
-
-            # Handling comment entries
-            for idx, comment_entry in enumerate(comments):
-                corresponding_sentiment = sentiments[idx] if idx < len(sentiments) else "Unknown"
-                corresponding_topic = None
-
-                if idx < len(topics):
-                    topic_entry = topics[idx]
-                    if isinstance(topic_entry, dict):
-                        corresponding_topic = topic_entry.get("topic", "Unknown")
-                    else:
-                        corresponding_topic = topic_entry  # if it's just a string
-
-                if isinstance(comment_entry, dict):
-                    text = comment_entry.get("text")
-                    sentiment = comment_entry.get("sentiment", corresponding_sentiment)
-                    topic = comment_entry.get("topic", corresponding_topic)
-                    if text:
-                        all_comments.append({
-                            "text": text,
-                            "sentiment": sentiment if sentiment else "Unknown",
-                            "topic": topic if topic else "Unknown"
-                        })
-                else:  # If it's a string, handle accordingly
-                    all_comments.append({
-                        "text": comment_entry,
-                        "sentiment": corresponding_sentiment,
-                        "topic": corresponding_topic if corresponding_topic else "Unknown"
-                    })
-
-        files = [f["filename"] for f in sorted_file_data]
-
-        # Analyze teacher performance
-        teacher_performance = {}
-        for teacher in teachers:
-            teacher_performance[teacher.uName] = {"doing_well": 0, "not_doing_well": 0}
-
-        for topic_data in all_topics:
-            topic = topic_data["topic"]
-            sentiment = topic_data["sentiment"]
-
-            for upload in uploads:
-                topics_upload = extract_json_chunks('topics', upload)
-                for topic_entry_upload in topics_upload:
-                    extracted_topic = topic_entry_upload.get("topic") if isinstance(topic_entry_upload, dict) else topic_entry_upload
-                    extracted_sentiment = topic_entry_upload.get("sentiment") if isinstance(topic_entry_upload, dict) else all_sentiments[topics_upload.index(topic_entry_upload)]["sentiment_score"] if topics_upload.index(topic_entry_upload) < len(all_sentiments) else "Unknown" # Best effort to get sentiment
-
-                    if extracted_topic == topic:
-                        teacher_uname = upload.teacher_uname
-                        if teacher_uname in teacher_performance:
-                            if extracted_sentiment == "Negative":
-                                teacher_performance[teacher_uname]["not_doing_well"] += 1
-                            elif extracted_sentiment == "Positive":
-                                teacher_performance[teacher_uname]["doing_well"] += 1
+        # Single pass over every upload in scope
+        aggregate = aggregate_uploads(uploads)
+        files = aggregate["files"]
+        all_sentiments = aggregate["sentiment"]
+        all_topics = aggregate["topics"]
+        all_comments = aggregate["comments"]
+
+        # Analyze teacher performance from a per-teacher topic/sentiment index
+        performance_by_teacher = teacher_performance(teachers, uploads, all_sentiments, all_topics)
 
         # The number of teachers who are and aren't doing well
         teachers_doing_well_count = 0
         teachers_not_doing_well_count = 0
         total_teachers = 0
 
-        for teacher_uname, performance in teacher_performance.items():
+        for teacher_uname, performance in performance_by_teacher.items():
             if performance["doing_well"] > performance["not_doing_well"]:
                 teachers_doing_well_count += 1
             elif performance["not_doing_well"] >= performance["doing_well"]:
@@ -1640,134 +1895,27 @@ def campus_analytics():
             return jsonify({"error": "Campus or College not found."}), 404
 
         # Fetch teachers in this specific campus and college (no program filter)
-        teachers = User.query.filter_by(
-            campus_acronym=campus_acronym,
-            college_name=college.college_name,
-            userType="Teacher",
-            isDeleted=False
-        ).all()
+        teachers = scope_teachers("college", campus_acronym, college.college_name)
 
         if not teachers:
             return jsonify({"error": "No teachers found for this college in the campus."}), 404
 
+        # Counts-only payload aggregated in SQL, raw comments are paged via /analytics_comments
+        if request.args.get("view") == "counts":
+            return jsonify(summarize_scope([t.uName for t in teachers])), 200
+
         # Fetch their uploads
-        uploads = CSVUpload.query.filter(
-            CSVUpload.teacher_uname.in_([t.uName for t in teachers])
-        ).all()
+        uploads = scope_uploads([t.uName for t in teachers])
 
         if not uploads:
             return jsonify({"error": "No uploaded sentiment data found for this college."}), 404
 
-        import re, json
-        def extract_json_chunks(prefix, upload):
-            chunks = []
-            for attr in dir(upload):
-                if re.match(f"{prefix}\\d+", attr):
-                    chunk = getattr(upload, attr)
-                    if chunk is None:
-                        continue
-                    if isinstance(chunk, list):
-                        chunks.extend(chunk)
-                    elif isinstance(chunk, str):
-                        try:
-                            parsed = json.loads(chunk)
-                            if isinstance(parsed, (list, dict)):
-                                chunks.extend(parsed if isinstance(parsed, list) else [parsed])
-                        except json.JSONDecodeError:
-                            continue
-                    elif isinstance(chunk, dict):
-                        chunks.append(chunk)
-            return chunks
-
-        file_data = {}
-
-        for upload in sorted(uploads, key=lambda x: x.upload_date):
-            comments_chunks = extract_json_chunks('comments', upload)
-            sentiment_chunks = extract_json_chunks('sentiment', upload)
-            topics_chunks = extract_json_chunks('topics', upload)
-
-            if upload.filename not in file_data:
-                file_data[upload.filename] = {
-                    "filename": upload.filename,
-                    "sentiment": [],
-                    "topics": [],
-                    "comments": []
-                }
-
-            file_data[upload.filename]["sentiment"].extend(sentiment_chunks)
-            file_data[upload.filename]["topics"].extend(topics_chunks)
-            file_data[upload.filename]["comments"].extend(comments_chunks)
-
-        def sort_key(filename):
-            try:
-                start, end, sem = map(int, filename.split('_'))
-                return (start, end, sem)
-            except:
-                return (9999, 9999, 9)
-
-        sorted_file_data = [file_data[f] for f in sorted(file_data.keys(), key=sort_key)]
-
-        all_sentiments = []
-        all_topics = []
-        all_comments = []
-
-        for file_entry in sorted_file_data:
-            sentiments = file_entry.get("sentiment", [])
-            topics = file_entry.get("topics", [])
-            comments = file_entry.get("comments", [])
-
-            for sentiment_entry in sentiments:
-                all_sentiments.append({
-                    "filename": file_entry["filename"],
-                    "sentiment_score": sentiment_entry
-                })
-
-            for idx, topic_entry in enumerate(topics):
-                corresponding_sentiment = sentiments[idx] if idx < len(sentiments) else "Unknown"
-
-                if isinstance(topic_entry, dict):
-                    topic = topic_entry.get("topic")
-                    sentiment = topic_entry.get("sentiment", corresponding_sentiment)
-                    if topic is not None and sentiment is not None:
-                        all_topics.append({
-                            "topic": topic,
-                            "sentiment": sentiment
-                        })
-                else:
-                    all_topics.append({
-                        "topic": topic_entry,
-                        "sentiment": corresponding_sentiment
-                    })
-
-            for idx, comment_entry in enumerate(comments):
-                corresponding_sentiment = sentiments[idx] if idx < len(sentiments) else "Unknown"
-                corresponding_topic = None
-
-                if idx < len(topics):
-                    topic_entry = topics[idx]
-                    if isinstance(topic_entry, dict):
-                        corresponding_topic = topic_entry.get("topic", "Unknown")
-                    else:
-                        corresponding_topic = topic_entry
-
-                if isinstance(comment_entry, dict):
-                    text = comment_entry.get("text")
-                    sentiment = comment_entry.get("sentiment", corresponding_sentiment)
-                    topic = comment_entry.get("topic", corresponding_topic)
-                    if text:
-                        all_comments.append({
-                            "text": text,
-                            "sentiment": sentiment if sentiment else "Unknown",
-                            "topic": topic if topic else "Unknown"
-                        })
-                else:
-                    all_comments.append({
-                        "text": comment_entry,
-                        "sentiment": corresponding_sentiment,
-                        "topic": corresponding_topic if corresponding_topic else "Unknown"
-                    })
-
-        files = [f["filename"] for f in sorted_file_data]
+        # Single pass over every upload in scope
+        aggregate = aggregate_uploads(uploads)
+        files = aggregate["files"]
+        all_sentiments = aggregate["sentiment"]
+        all_topics = aggregate["topics"]
+        all_comments = aggregate["comments"]
 
         return jsonify({
             "files": files,
@@ -1794,138 +1942,29 @@ def dashboard_analytics():
             return jsonify({"error": "Campus not found."}), 404
 
         # Fetch all teachers in this campus (all colleges and programs under the campus)
-        teachers = User.query.filter_by(
-            campus_acronym=campus_acronym,
-            userType="Teacher",
-            isDeleted=False
-        ).all()
+        teachers = scope_teachers("campus", campus_acronym)
 
         if not teachers:
             return jsonify({"error": "No teachers found for this campus."}), 404
 
+        # Counts-only payload aggregated in SQL, raw comments are paged via /analytics_comments
+        if request.args.get("view") == "counts":
+            summary = summarize_scope([t.uName for t in teachers])
+            summary["campus_acronym"] = campus_acronym
+            return jsonify(summary), 200
+
         # Fetch their uploads
-        uploads = CSVUpload.query.filter(
-            CSVUpload.teacher_uname.in_([t.uName for t in teachers])
-        ).all()
+        uploads = scope_uploads([t.uName for t in teachers])
 
         if not uploads:
             return jsonify({"error": "No uploaded sentiment data found for this campus."}), 404
 
-        import re, json
-
-        def extract_json_chunks(prefix, upload):
-            chunks = []
-            for attr in dir(upload):
-                if re.match(f"{prefix}\\d+", attr):
-                    chunk = getattr(upload, attr)
-                    if chunk is None:
-                        continue
-                    if isinstance(chunk, list):
-                        chunks.extend(chunk)
-                    elif isinstance(chunk, str):
-                        try:
-                            parsed = json.loads(chunk)
-                            if isinstance(parsed, (list, dict)):
-                                chunks.extend(parsed if isinstance(parsed, list) else [parsed])
-                        except json.JSONDecodeError:
-                            continue
-                    elif isinstance(chunk, dict):
-                        chunks.append(chunk)
-            return chunks
-
-        file_data = {}
-
-        # Loop through all uploads and aggregate data by file
-        for upload in sorted(uploads, key=lambda x: x.upload_date):
-            comments_chunks = extract_json_chunks('comments', upload)
-            sentiment_chunks = extract_json_chunks('sentiment', upload)
-            topics_chunks = extract_json_chunks('topics', upload)
-
-            if upload.filename not in file_data:
-                file_data[upload.filename] = {
-                    "filename": upload.filename,
-                    "sentiment": [],
-                    "topics": [],
-                    "comments": []
-                }
-
-            file_data[upload.filename]["sentiment"].extend(sentiment_chunks)
-            file_data[upload.filename]["topics"].extend(topics_chunks)
-            file_data[upload.filename]["comments"].extend(comments_chunks)
-
-        # Sort files based on naming convention or date
-        def sort_key(filename):
-            try:
-                start, end, sem = map(int, filename.split('_'))
-                return (start, end, sem)
-            except:
-                return (9999, 9999, 9)
-
-        sorted_file_data = [file_data[f] for f in sorted(file_data.keys(), key=sort_key)]
-
-        all_sentiments = []
-        all_topics = []
-        all_comments = []
-
-        # Aggregate sentiments, topics, and comments for each file
-        for file_entry in sorted_file_data:
-            sentiments = file_entry.get("sentiment", [])
-            topics = file_entry.get("topics", [])
-            comments = file_entry.get("comments", [])
-
-            for sentiment_entry in sentiments:
-                all_sentiments.append({
-                    "filename": file_entry["filename"],
-                    "sentiment_score": sentiment_entry
-                })
-
-            for idx, topic_entry in enumerate(topics):
-                corresponding_sentiment = sentiments[idx] if idx < len(sentiments) else "Unknown"
-
-                if isinstance(topic_entry, dict):
-                    topic = topic_entry.get("topic")
-                    sentiment = topic_entry.get("sentiment", corresponding_sentiment)
-                    if topic is not None and sentiment is not None:
-                        all_topics.append({
-                            "topic": topic,
-                            "sentiment": sentiment
-                        })
-                else:
-                    all_topics.append({
-                        "topic": topic_entry,
-                        "sentiment": corresponding_sentiment
-                    })
-
-            for idx, comment_entry in enumerate(comments):
-                corresponding_sentiment = sentiments[idx] if idx < len(sentiments) else "Unknown"
-                corresponding_topic = None
-
-                if idx < len(topics):
-                    topic_entry = topics[idx]
-                    if isinstance(topic_entry, dict):
-                        corresponding_topic = topic_entry.get("topic", "Unknown")
-                    else:
-                        corresponding_topic = topic_entry
-
-                if isinstance(comment_entry, dict):
-                    text = comment_entry.get("text")
-                    sentiment = comment_entry.get("sentiment", corresponding_sentiment)
-                    topic = comment_entry.get("topic", corresponding_topic)
-                    if text:
-                        all_comments.append({
-                            "text": text,
-                            "sentiment": sentiment if sentiment else "Unknown",
-                            "topic": topic if topic else "Unknown"
-                        })
-                else:
-                    all_comments.append({
-                        "text": comment_entry,
-                        "sentiment": corresponding_sentiment,
-                        "topic": corresponding_topic if corresponding_topic else "Unknown"
-                    })
-
-        # List of all files in the campus (aggregated)
-        files = [f["filename"] for f in sorted_file_data]
+        # Single pass over every upload in scope
+        aggregate = aggregate_uploads(uploads)
+        files = aggregate["files"]
+        all_sentiments = aggregate["sentiment"]
+        all_topics = aggregate["topics"]
+        all_comments = aggregate["comments"]
 
         return jsonify({
             "campus_acronym": campus_acronym,
@@ -1939,139 +1978,74 @@ def dashboard_analytics():
         print(traceback.format_exc())
         return jsonify({"error": "Internal Server Error"}), 500
 
+@app.route('/analytics_comments', methods=['GET'])
+def analytics_comments():
+    """ Pages through raw comments for a campus, college or program scope """
+    try:
+        campus_acronym = request.args.get("campus_acronym")
+        college_acronym = request.args.get("college_acronym")
+        program_acronym = request.args.get("program_acronym")
+        page = max(request.args.get("page", 1, type=int), 1)
+        per_page = min(max(request.args.get("per_page", 100, type=int), 1), 500)
+
+        college_name = None
+        if college_acronym:
+            college = College.query.filter_by(college_acronym=college_acronym).first()
+            if not college:
+                return jsonify({"error": "College not found."}), 404
+            college_name = college.college_name
+
+        if program_acronym:
+            scope = "program"
+        elif college_acronym:
+            scope = "college"
+        elif campus_acronym:
+            scope = "campus"
+        else:
+            scope = "all"
+
+        teachers = scope_teachers(scope, campus_acronym, college_name, program_acronym)
+        if not teachers:
+            return jsonify({"error": "No teachers found for this scope."}), 404
+
+        return jsonify(page_comments(
+            [t.uName for t in teachers],
+            page=page,
+            per_page=per_page,
+            topic=request.args.get("topic"),
+            sentiment=request.args.get("sentiment"),
+            filename=request.args.get("filename")
+        )), 200
+
+    except Exception as e:
+        print(traceback.format_exc())
+        return jsonify({"error": "Internal Server Error"}), 500
+
 @app.route('/dashboard_analytics_all_campuses', methods=['GET'])
 def dashboard_analytics_all_campuses():
     try:
-        def extract_json_chunks(prefix, upload):
-            chunks = []
-            for attr in dir(upload):
-                if re.match(f"{prefix}\\d+", attr):
-                    chunk = getattr(upload, attr)
-                    if chunk is None:
-                        continue
-                    if isinstance(chunk, list):
-                        chunks.extend(chunk)
-                    elif isinstance(chunk, str):
-                        try:
-                            parsed = json.loads(chunk)
-                            if isinstance(parsed, (list, dict)):
-                                chunks.extend(parsed if isinstance(parsed, list) else [parsed])
-                        except json.JSONDecodeError:
-                            continue
-                    elif isinstance(chunk, dict):
-                        chunks.append(chunk)
-            return chunks
-
         # Fetch all teachers across all campuses
-        teachers = User.query.filter_by(
-            userType="Teacher",
-            isDeleted=False
-        ).all()
+        teachers = scope_teachers("all")
 
         if not teachers:
             return jsonify({"error": "No teachers found across all campuses."}), 404
 
+        # Counts-only payload aggregated in SQL, raw comments are paged via /analytics_comments
+        if request.args.get("view") == "counts":
+            return jsonify(summarize_scope([t.uName for t in teachers])), 200
+
         # Fetch their uploads
-        uploads = CSVUpload.query.filter(
-            CSVUpload.teacher_uname.in_([t.uName for t in teachers])
-        ).all()
+        uploads = scope_uploads([t.uName for t in teachers])
 
         if not uploads:
             return jsonify({"error": "No uploaded sentiment data found for any campus."}), 404
 
-        file_data = {}
-
-        # Loop through all uploads and aggregate data by file
-        for upload in sorted(uploads, key=lambda x: x.upload_date):
-            comments_chunks = extract_json_chunks('comments', upload)
-            sentiment_chunks = extract_json_chunks('sentiment', upload)
-            topics_chunks = extract_json_chunks('topics', upload)
-
-            if upload.filename not in file_data:
-                file_data[upload.filename] = {
-                    "filename": upload.filename,
-                    "sentiment": [],
-                    "topics": [],
-                    "comments": []
-                }
-
-            file_data[upload.filename]["sentiment"].extend(sentiment_chunks)
-            file_data[upload.filename]["topics"].extend(topics_chunks)
-            file_data[upload.filename]["comments"].extend(comments_chunks)
-
-        # Sort files based on naming convention or date
-        def sort_key(filename):
-            try:
-                start, end, sem = map(int, filename.split('_'))
-                return (start, end, sem)
-            except ValueError:  # Catch error if filename doesn't match pattern
-                return (9999, 9999, 9)
-
-        sorted_file_data = [file_data[f] for f in sorted(file_data.keys(), key=sort_key)]
-
-        all_sentiments = []
-        all_topics = []
-        all_comments = []
-
-        # Aggregate sentiments, topics, and comments for each file
-        for file_entry in sorted_file_data:
-            sentiments = file_entry.get("sentiment", [])
-            topics = file_entry.get("topics", [])
-            comments = file_entry.get("comments", [])
-
-            for sentiment_entry in sentiments:
-                all_sentiments.append({
-                    "filename": file_entry["filename"],
-                    "sentiment_score": sentiment_entry
-                })
-
-            for idx, topic_entry in enumerate(topics):
-                corresponding_sentiment = sentiments[idx] if idx < len(sentiments) else "Unknown"
-
-                if isinstance(topic_entry, dict):
-                    topic = topic_entry.get("topic")
-                    sentiment = topic_entry.get("sentiment", corresponding_sentiment)
-                    if topic is not None and sentiment is not None:
-                        all_topics.append({
-                            "topic": topic,
-                            "sentiment": sentiment
-                        })
-                else:
-                    all_topics.append({
-                        "topic": topic_entry,
-                        "sentiment": corresponding_sentiment
-                    })
-
-            for idx, comment_entry in enumerate(comments):
-                corresponding_sentiment = sentiments[idx] if idx < len(sentiments) else "Unknown"
-                corresponding_topic = None
-
-                if idx < len(topics):
-                    topic_entry = topics[idx]
-                    if isinstance(topic_entry, dict):
-                        corresponding_topic = topic_entry.get("topic", "Unknown")
-                    else:
-                        corresponding_topic = topic_entry
-
-                if isinstance(comment_entry, dict):
-                    text = comment_entry.get("text")
-                    sentiment = comment_entry.get("sentiment", corresponding_sentiment)
-                    topic = comment_entry.get("topic", corresponding_topic)
-                    if text:
-                        all_comments.append({
-                            "text": text,
-                            "sentiment": sentiment if sentiment else "Unknown",
-                            "topic": topic if topic else "Unknown"
-                        })
-                else:
-                    all_comments.append({
-                        "text": comment_entry,
-                        "sentiment": corresponding_sentiment,
-                        "topic": corresponding_topic if corresponding_topic else "Unknown"
-                    })
-
-        # List of all files aggregated
-        files = [f["filename"] for f in sorted_file_data]
+        # Single pass over every upload in scope
+        aggregate = aggregate_uploads(uploads)
+        files = aggregate["files"]
+        all_sentiments = aggregate["sentiment"]
+        all_topics = aggregate["topics"]
+        all_comments = aggregate["comments"]
 
         return jsonify({
             "files": files,
@@ -2110,137 +2084,23 @@ def download_college_report():
             return jsonify({"error": "Campus not found."}), 404
 
         # Fetch all teachers in this campus and college (all programs under the college and campus)
-        teachers = User.query.filter_by(
-            campus_acronym=campus_acronym,
-            college_name=college.college_name,
-            userType="Teacher",
-            isDeleted=False
-        ).all()
+        teachers = scope_teachers("college", campus_acronym, college.college_name)
 
         if not teachers:
             return jsonify({"error": "No teachers found for this college."}), 404
 
         # Fetch their uploads
-        uploads = CSVUpload.query.filter(
-            CSVUpload.teacher_uname.in_([t.uName for t in teachers])
-        ).all()
+        uploads = scope_uploads([t.uName for t in teachers])
 
         if not uploads:
             return jsonify({"error": "No uploaded sentiment data found for this college."}), 404
 
-        def extract_json_chunks(prefix, upload):
-            chunks = []
-            for attr in dir(upload):
-                if re.match(f"{prefix}\\d+", attr):
-                    chunk = getattr(upload, attr)
-                    if chunk is None:
-                        continue
-                    if isinstance(chunk, list):
-                        chunks.extend(chunk)
-                    elif isinstance(chunk, str):
-                        try:
-                            parsed = json.loads(chunk)
-                            if isinstance(parsed, (list, dict)):
-                                chunks.extend(parsed if isinstance(parsed, list) else [parsed])
-                        except json.JSONDecodeError:
-                            continue
-                    elif isinstance(chunk, dict):
-                        chunks.append(chunk)
-            return chunks
-
-        file_data = {}
-
-        # Loop through all uploads and aggregate data by file
-        for upload in sorted(uploads, key=lambda x: x.upload_date):
-            comments_chunks = extract_json_chunks('comments', upload)
-            sentiment_chunks = extract_json_chunks('sentiment', upload)
-            topics_chunks = extract_json_chunks('topics', upload)
-
-            if upload.filename not in file_data:
-                file_data[upload.filename] = {
-                    "filename": upload.filename,
-                    "sentiment": [],
-                    "topics": [],
-                    "comments": []
-                }
-
-            file_data[upload.filename]["sentiment"].extend(sentiment_chunks)
-            file_data[upload.filename]["topics"].extend(topics_chunks)
-            file_data[upload.filename]["comments"].extend(comments_chunks)
-
-        # Sort files based on naming convention or date
-        def sort_key(filename):
-            try:
-                start, end, sem = map(int, filename.split('_'))
-                return (start, end, sem)
-            except:
-                return (9999, 9999, 9)
-
-        sorted_file_data = [file_data[f] for f in sorted(file_data.keys(), key=sort_key)]
-
-        all_sentiments = []
-        all_topics = []
-        all_comments = []
-
-        # Aggregate sentiments, topics, and comments for each file
-        for file_entry in sorted_file_data:
-            sentiments = file_entry.get("sentiment", [])
-            topics = file_entry.get("topics", [])
-            comments = file_entry.get("comments", [])
-
-            for sentiment_entry in sentiments:
-                all_sentiments.append({
-                    "filename": file_entry["filename"],
-                    "sentiment_score": sentiment_entry
-                })
-
-            for idx, topic_entry in enumerate(topics):
-                corresponding_sentiment = sentiments[idx] if idx < len(sentiments) else "Unknown"
-
-                if isinstance(topic_entry, dict):
-                    topic = topic_entry.get("topic")
-                    sentiment = topic_entry.get("sentiment", corresponding_sentiment)
-                    if topic is not None and sentiment is not None:
-                        all_topics.append({
-                            "topic": topic,
-                            "sentiment": sentiment
-                        })
-                else:
-                    all_topics.append({
-                        "topic": topic_entry,
-                        "sentiment": corresponding_sentiment
-                    })
-
-            for idx, comment_entry in enumerate(comments):
-                corresponding_sentiment = sentiments[idx] if idx < len(sentiments) else "Unknown"
-                corresponding_topic = None
-
-                if idx < len(topics):
-                    topic_entry = topics[idx]
-                    if isinstance(topic_entry, dict):
-                        corresponding_topic = topic_entry.get("topic", "Unknown")
-                    else:
-                        corresponding_topic = topic_entry
-
-                if isinstance(comment_entry, dict):
-                    text = comment_entry.get("text")
-                    sentiment = comment_entry.get("sentiment", corresponding_sentiment)
-                    topic = comment_entry.get("topic", corresponding_topic)
-                    if text:
-                        all_comments.append({
-                            "text": text,
-                            "sentiment": sentiment if sentiment else "Unknown",
-                            "topic": topic if topic else "Unknown"
-                        })
-                else:
-                    all_comments.append({
-                        "text": comment_entry,
-                        "sentiment": corresponding_sentiment,
-                        "topic": corresponding_topic if corresponding_topic else "Unknown"
-                    })
-
-        # List of all files in the college (aggregated)
-        files = [f["filename"] for f in sorted_file_data]
+        # Single pass over every upload in scope
+        aggregate = aggregate_uploads(uploads)
+        files = aggregate["files"]
+        all_sentiments = aggregate["sentiment"]
+        all_topics = aggregate["topics"]
+        all_comments = aggregate["comments"]
         return college_report(college_acronym, files, all_sentiments, all_topics, all_comments)
         #return generate_college_report(college_acronym, files, all_sentiments, all_topics, all_comments)
     except Exception as e:
@@ -2467,138 +2327,23 @@ def download_campus_report():
             return jsonify({"error": "Campus not found."}), 404
 
         # Fetch all teachers in this campus (all colleges and programs under the campus)
-        teachers = User.query.filter_by(
-            campus_acronym=campus_acronym,
-            userType="Teacher",
-            isDeleted=False
-        ).all()
+        teachers = scope_teachers("campus", campus_acronym)
 
         if not teachers:
             return jsonify({"error": "No teachers found for this campus."}), 404
 
         # Fetch their uploads
-        uploads = CSVUpload.query.filter(
-            CSVUpload.teacher_uname.in_([t.uName for t in teachers])
-        ).all()
+        uploads = scope_uploads([t.uName for t in teachers])
 
         if not uploads:
             return jsonify({"error": "No uploaded sentiment data found for this campus."}), 404
 
-        import re, json
-
-        def extract_json_chunks(prefix, upload):
-            chunks = []
-            for attr in dir(upload):
-                if re.match(f"{prefix}\\d+", attr):
-                    chunk = getattr(upload, attr)
-                    if chunk is None:
-                        continue
-                    if isinstance(chunk, list):
-                        chunks.extend(chunk)
-                    elif isinstance(chunk, str):
-                        try:
-                            parsed = json.loads(chunk)
-                            if isinstance(parsed, (list, dict)):
-                                chunks.extend(parsed if isinstance(parsed, list) else [parsed])
-                        except json.JSONDecodeError:
-                            continue
-                    elif isinstance(chunk, dict):
-                        chunks.append(chunk)
-            return chunks
-
-        file_data = {}
-
-        # Loop through all uploads and aggregate data by file
-        for upload in sorted(uploads, key=lambda x: x.upload_date):
-            comments_chunks = extract_json_chunks('comments', upload)
-            sentiment_chunks = extract_json_chunks('sentiment', upload)
-            topics_chunks = extract_json_chunks('topics', upload)
-
-            if upload.filename not in file_data:
-                file_data[upload.filename] = {
-                    "filename": upload.filename,
-                    "sentiment": [],
-                    "topics": [],
-                    "comments": []
-                }
-
-            file_data[upload.filename]["sentiment"].extend(sentiment_chunks)
-            file_data[upload.filename]["topics"].extend(topics_chunks)
-            file_data[upload.filename]["comments"].extend(comments_chunks)
-
-        # Sort files based on naming convention or date
-        def sort_key(filename):
-            try:
-                start, end, sem = map(int, filename.split('_'))
-                return (start, end, sem)
-            except:
-                return (9999, 9999, 9)
-
-        sorted_file_data = [file_data[f] for f in sorted(file_data.keys(), key=sort_key)]
-
-        all_sentiments = []
-        all_topics = []
-        all_comments = []
-
-        # Aggregate sentiments, topics, and comments for each file
-        for file_entry in sorted_file_data:
-            sentiments = file_entry.get("sentiment", [])
-            topics = file_entry.get("topics", [])
-            comments = file_entry.get("comments", [])
-
-            for sentiment_entry in sentiments:
-                all_sentiments.append({
-                    "filename": file_entry["filename"],
-                    "sentiment_score": sentiment_entry
-                })
-
-            for idx, topic_entry in enumerate(topics):
-                corresponding_sentiment = sentiments[idx] if idx < len(sentiments) else "Unknown"
-
-                if isinstance(topic_entry, dict):
-                    topic = topic_entry.get("topic")
-                    sentiment = topic_entry.get("sentiment", corresponding_sentiment)
-                    if topic is not None and sentiment is not None:
-                        all_topics.append({
-                            "topic": topic,
-                            "sentiment": sentiment
-                        })
-                else:
-                    all_topics.append({
-                        "topic": topic_entry,
-                        "sentiment": corresponding_sentiment
-                    })
-
-            for idx, comment_entry in enumerate(comments):
-                corresponding_sentiment = sentiments[idx] if idx < len(sentiments) else "Unknown"
-                corresponding_topic = None
-
-                if idx < len(topics):
-                    topic_entry = topics[idx]
-                    if isinstance(topic_entry, dict):
-                        corresponding_topic = topic_entry.get("topic", "Unknown")
-                    else:
-                        corresponding_topic = topic_entry
-
-                if isinstance(comment_entry, dict):
-                    text = comment_entry.get("text")
-                    sentiment = comment_entry.get("sentiment", corresponding_sentiment)
-                    topic = comment_entry.get("topic", corresponding_topic)
-                    if text:
-                        all_comments.append({
-                            "text": text,
-                            "sentiment": sentiment if sentiment else "Unknown",
-                            "topic": topic if topic else "Unknown"
-                        })
-                else:
-                    all_comments.append({
-                        "text": comment_entry,
-                        "sentiment": corresponding_sentiment,
-                        "topic": corresponding_topic if corresponding_topic else "Unknown"
-                    })
-
-        # List of all files in the campus (aggregated)
-        files = [f["filename"] for f in sorted_file_data]
+        # Single pass over every upload in scope
+        aggregate = aggregate_uploads(uploads)
+        files = aggregate["files"]
+        all_sentiments = aggregate["sentiment"]
+        all_topics = aggregate["topics"]
+        all_comments = aggregate["comments"]
         return campus_report(campus_acronym,files,all_sentiments,all_topics,all_comments)
         #return generate_campus_report(campus_acronym, files, all_sentiments, all_topics, all_comments)  
     except Exception as e:
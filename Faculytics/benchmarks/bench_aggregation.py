@@ -0,0 +1,163 @@
+"""
+Benchmark the shared upload aggregation engine (Faculytics.analytics.aggregate_uploads).
+
+Usage:
+    python benchmarks/bench_aggregation.py [--comments 10000] [--per-upload 1500] [--repeat 5]
+
+Builds synthetic uploads in memory (no database needed) and times:
+  * the engine over Comments-table rows,
+  * the engine over legacy comments1/2/3 chunk columns,
+  * the per-endpoint block it replaced, over the same chunk columns.
+Results are reported as milliseconds per 10k comments, and the engine output
+is checked against the legacy block.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Faculytics.analytics import aggregate_uploads
+from Faculytics.models import CSVUpload
+
+TOPICS = [
+    "Teaching Effectiveness", "Preparedness and Punctuality", "Fairness and Supportiveness", "Student Engagement",
+    "Professional Appearance", "Cleanliness and Classroom Management", "Teaching Quality",
+    "Availability and Communication", "Tardiness", "Assessment Fairness and Difficulty",
+    "Instructional Materials and Aids"
+]
+
+
+def make_uploads(total_comments, per_upload, seed=7):
+    rng = random.Random(seed)
+    row_uploads, chunk_uploads = [], []
+    base_date = datetime(2020, 1, 1)
+    upload_idx = 0
+    remaining = total_comments
+    while remaining > 0:
+        size = min(per_upload, remaining)
+        remaining -= size
+        comments = [f"comment {upload_idx}-{i} " + "good " * rng.randint(1, 20) for i in range(size)]
+        sentiments = [rng.choice(["Positive", "Negative"]) for _ in range(size)]
+        topics = [rng.choice(TOPICS) for _ in range(size)]
+        year = 2015 + upload_idx // 2
+        filename = f"{year}_{year + 1}_{upload_idx % 2 + 1}.csv"
+        upload_date = base_date + timedelta(days=upload_idx)
+
+        rows = [SimpleNamespace(text=c, sentiment=s, topic=t) for c, s, t in zip(comments, sentiments, topics)]
+        row_uploads.append(SimpleNamespace(filename=filename, upload_date=upload_date, comment_rows=rows))
+
+        chunked = CSVUpload(filename=filename, upload_date=upload_date)
+        for chunk_no in range(3):
+            part = slice(chunk_no * 500, (chunk_no + 1) * 500)
+            setattr(chunked, f"comments{chunk_no + 1}", json.dumps(comments[part]) if comments[part] else None)
+            setattr(chunked, f"sentiment{chunk_no + 1}", json.dumps(sentiments[part]) if sentiments[part] else None)
+            setattr(chunked, f"topics{chunk_no + 1}", json.dumps(topics[part]) if topics[part] else None)
+        chunk_uploads.append(chunked)
+        upload_idx += 1
+    return row_uploads, chunk_uploads
+
+
+def legacy_aggregate(uploads):
+    """ The block previously copy-pasted into each analytics/report endpoint """
+    def extract_json_chunks(prefix, upload):
+        chunks = []
+        for attr in dir(upload):
+            if re.match(f"{prefix}\\d+", attr):
+                chunk = getattr(upload, attr)
+                if chunk is None:
+                    continue
+                if isinstance(chunk, list):
+                    chunks.extend(chunk)
+                elif isinstance(chunk, str):
+                    try:
+                        parsed = json.loads(chunk)
+                        if isinstance(parsed, (list, dict)):
+                            chunks.extend(parsed if isinstance(parsed, list) else [parsed])
+                    except json.JSONDecodeError:
+                        continue
+                elif isinstance(chunk, dict):
+                    chunks.append(chunk)
+        return chunks
+
+    file_data = {}
+    for upload in sorted(uploads, key=lambda x: x.upload_date):
+        comments_chunks = extract_json_chunks('comments', upload)
+        sentiment_chunks = extract_json_chunks('sentiment', upload)
+        topics_chunks = extract_json_chunks('topics', upload)
+        if upload.filename not in file_data:
+            file_data[upload.filename] = {"filename": upload.filename, "sentiment": [], "topics": [], "comments": []}
+        file_data[upload.filename]["sentiment"].extend(sentiment_chunks)
+        file_data[upload.filename]["topics"].extend(topics_chunks)
+        file_data[upload.filename]["comments"].extend(comments_chunks)
+
+    def sort_key(filename):
+        try:
+            start, end, sem = map(int, filename.split('_'))
+            return (start, end, sem)
+        except:
+            return (9999, 9999, 9)
+
+    sorted_file_data = [file_data[f] for f in sorted(file_data.keys(), key=sort_key)]
+    all_sentiments, all_topics, all_comments = [], [], []
+    for file_entry in sorted_file_data:
+        sentiments = file_entry.get("sentiment", [])
+        topics = file_entry.get("topics", [])
+        comments = file_entry.get("comments", [])
+        for sentiment_entry in sentiments:
+            all_sentiments.append({"filename": file_entry["filename"], "sentiment_score": sentiment_entry})
+        for idx, topic_entry in enumerate(topics):
+            corresponding_sentiment = sentiments[idx] if idx < len(sentiments) else "Unknown"
+            all_topics.append({"topic": topic_entry, "sentiment": corresponding_sentiment})
+        for idx, comment_entry in enumerate(comments):
+            corresponding_sentiment = sentiments[idx] if idx < len(sentiments) else "Unknown"
+            corresponding_topic = topics[idx] if idx < len(topics) else None
+            all_comments.append({
+                "text": comment_entry,
+                "sentiment": corresponding_sentiment,
+                "topic": corresponding_topic if corresponding_topic else "Unknown"
+            })
+
+    return {
+        "files": [f["filename"] for f in sorted_file_data],
+        "sentiment": all_sentiments,
+        "topics": all_topics,
+        "comments": all_comments
+    }
+
+
+def best_of(fn, uploads, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(uploads)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=10000)
+    parser.add_argument("--per-upload", type=int, default=1500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    row_uploads, chunk_uploads = make_uploads(args.comments, args.per_upload)
+    assert aggregate_uploads(row_uploads) == legacy_aggregate(chunk_uploads), "engine output differs from legacy block"
+    assert aggregate_uploads(chunk_uploads) == legacy_aggregate(chunk_uploads), "engine output differs on chunk columns"
+
+    scale = 10000 / args.comments * 1000
+    print(f"{args.comments} comments in {len(row_uploads)} uploads, best of {args.repeat}")
+    print(f"  engine, Comments rows : {best_of(aggregate_uploads, row_uploads, args.repeat) * scale:8.2f} ms / 10k comments")
+    print(f"  engine, chunk columns : {best_of(aggregate_uploads, chunk_uploads, args.repeat) * scale:8.2f} ms / 10k comments")
+    print(f"  legacy endpoint block : {best_of(legacy_aggregate, chunk_uploads, args.repeat) * scale:8.2f} ms / 10k comments")
+
+
+if __name__ == "__main__":
+    main()
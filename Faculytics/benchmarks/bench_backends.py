@@ -0,0 +1,63 @@
+"""
+Throughput of the fp32, int8 and ONNX inference backends on CPU.
+
+Usage:
+    python benchmarks/bench_backends.py [--csv benchmarks/fixtures/comments.csv] [--comments 1500] [--repeat 3]
+
+The fixture comments are repeated up to --comments (a typical upload size) and
+run through the sentiment model and the MiniLM encoder of each backend, with
+the inference cache off. Reports comments per second, best of --repeat, plus
+the one-off load time. The onnx backend needs `flask export-onnx` first.
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Faculytics.src.ModelStore_functions import ModelStore
+from Faculytics.src.SentimentAnalysis_functions import SentimentAnalyzer
+from Faculytics.src.TopicModeling_functions import CommentProcessor
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "comments.csv")
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--comments", type=int, default=1500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backends", nargs="+", default=["fp32", "int8", "onnx"])
+    args = parser.parse_args()
+
+    fixture = pd.read_csv(args.csv)["comment"].astype(str).tolist()
+    comments = (fixture * (args.comments // len(fixture) + 1))[:args.comments]
+    store = ModelStore()
+
+    print(f"{len(comments)} comments, best of {args.repeat}, cache off")
+    print(f"{'backend':<8}{'load s':>8}{'sentiment/s':>14}{'embedding/s':>14}")
+    for backend in args.backends:
+        start = time.perf_counter()
+        analyzer = SentimentAnalyzer(store=store, batching=False, backend=backend)
+        processor = CommentProcessor(classifier_mode="embedding", store=store, backend=backend)
+        load_time = time.perf_counter() - start
+
+        sentiment_time = best_of(lambda: analyzer.predict(comments), args.repeat)
+        embedding_time = best_of(lambda: processor.encode_comments(comments), args.repeat)
+        print(f"{backend:<8}{load_time:>8.1f}{len(comments) / sentiment_time:>14.0f}{len(comments) / embedding_time:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
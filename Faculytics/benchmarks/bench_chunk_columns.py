@@ -0,0 +1,103 @@
+"""
+Micro-benchmark for reading the legacy comments/sentiment/topics chunk columns of one upload.
+
+Usage:
+    python benchmarks/bench_chunk_columns.py [--comments 1500] [--repeat 2000]
+
+Compares the old dir()+regex column discovery against CSVUpload.chunk_items,
+which reads the static CSVUpload.CHUNK_COLUMNS map, on an unsaved CSVUpload
+(no database needed). The "empty columns" case isolates column discovery, as
+for uploads whose data lives in the Comments table. Both readers are checked
+to return the same items.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Faculytics.models import CSVUpload
+
+KINDS = ("comments", "sentiment", "topics")
+
+
+def make_upload(total_comments, as_json_text):
+    upload = CSVUpload(filename="2023_2024_1", recommendation="")
+    if not total_comments:
+        return upload
+    columns = {
+        "comments": [f"comment {i}" for i in range(total_comments)],
+        "sentiment": ["Positive" if i % 3 else "Negative" for i in range(total_comments)],
+        "topics": ["Teaching Effectiveness" if i % 2 else "Tardiness" for i in range(total_comments)]
+    }
+    for kind, values in columns.items():
+        for chunk_no in range(3):
+            part = values[chunk_no * 500:(chunk_no + 1) * 500]
+            if part:
+                setattr(upload, f"{kind}{chunk_no + 1}", json.dumps(part) if as_json_text else part)
+    return upload
+
+
+def legacy_extract_json_chunks(prefix, upload):
+    """ The column discovery every extract_json_chunks variant used before CHUNK_COLUMNS """
+    chunks = []
+    for attr in dir(upload):
+        if re.match(f"{prefix}\\d+", attr):
+            chunk = getattr(upload, attr)
+            if chunk is None:
+                continue
+            if isinstance(chunk, list):
+                chunks.extend(chunk)
+            elif isinstance(chunk, str):
+                try:
+                    parsed = json.loads(chunk)
+                    if isinstance(parsed, (list, dict)):
+                        chunks.extend(parsed if isinstance(parsed, list) else [parsed])
+                except json.JSONDecodeError:
+                    continue
+            elif isinstance(chunk, dict):
+                chunks.append(chunk)
+    return chunks
+
+
+def legacy_read(upload):
+    return [legacy_extract_json_chunks(kind, upload) for kind in KINDS]
+
+
+def chunk_map_read(upload):
+    return [upload.chunk_items(kind) for kind in KINDS]
+
+
+def per_call(fn, upload, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(upload)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=1500)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"one upload, {args.comments} comments, {args.repeat} reads each")
+    cases = (
+        ("empty columns", 0, False),
+        ("JSON columns", args.comments, False),
+        ("JSON text columns", args.comments, True)
+    )
+    for label, total_comments, as_json_text in cases:
+        upload = make_upload(total_comments, as_json_text)
+        assert legacy_read(upload) == chunk_map_read(upload), "chunk readers disagree"
+
+        legacy = per_call(legacy_read, upload, args.repeat)
+        chunk_map = per_call(chunk_map_read, upload, args.repeat)
+        print(f"  {label:<18}: dir()+regex {legacy * 1e6:9.1f} us   CHUNK_COLUMNS {chunk_map * 1e6:9.1f} us   {legacy / chunk_map:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
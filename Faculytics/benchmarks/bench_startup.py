@@ -0,0 +1,78 @@
+"""
+Startup-time benchmark: how long `import Faculytics.views` takes in a fresh interpreter.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--warmup] [--top 15]
+
+Each run starts a new Python process so nothing is already imported. Model
+warm-up is off by default (MODEL_WARMUP=0) to time the import alone; --warmup
+also reports how long the background thread takes to get every model ready.
+--top lists the slowest top-level modules from `python -X importtime`.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import Faculytics.views as views
+imported = time.perf_counter() - started
+print(f"import {imported:.3f}")
+if {warmup}:
+    views.model_registry._warmup_thread.join()
+    print(f"ready {time.perf_counter() - started:.3f}")
+"""
+
+
+def run_once(warmup):
+    env = dict(os.environ, MODEL_WARMUP="1" if warmup else "0")
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.replace("{warmup}", str(warmup))],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return {line.split()[0]: float(line.split()[1]) for line in output.splitlines() if line[:6] in ("import", "ready ")}
+
+
+def slowest_imports(top):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import Faculytics.views"],
+        cwd=PROJECT_ROOT, env=dict(os.environ, MODEL_WARMUP="0"), capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented below the module that triggered them
+        if not name[1:].startswith(" "):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", action="store_true", help="Also time background model loading")
+    parser.add_argument("--top", type=int, default=0, help="Show the N slowest top-level imports")
+    args = parser.parse_args()
+
+    runs = [run_once(args.warmup) for _ in range(args.runs)]
+    imports = [run["import"] for run in runs]
+    print(f"import Faculytics.views: median {statistics.median(imports):.3f}s  min {min(imports):.3f}s  ({args.runs} runs)")
+    if args.warmup:
+        ready = [run["ready"] for run in runs]
+        print(f"all models ready       : median {statistics.median(ready):.3f}s  min {min(ready):.3f}s")
+
+    if args.top:
+        print("slowest top-level imports (cumulative):")
+        for cumulative, name in slowest_imports(args.top):
+            print(f"  {cumulative / 1e6:8.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    main()
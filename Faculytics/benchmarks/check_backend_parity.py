@@ -0,0 +1,81 @@
+"""
+Parity check of the int8 and ONNX inference backends against fp32.
+
+Usage:
+    python benchmarks/check_backend_parity.py [--csv benchmarks/fixtures/comments.csv] [--backends int8 onnx]
+
+For each backend the sentiment model and the MiniLM encoder are compared with
+fp32 on the fixture comments: sentiment label agreement and the largest
+probability difference, embedding cosine similarity, and agreement of the
+embedding topic classifier. Exits with status 1 when a backend falls below
+--min-agreement or --min-cosine, so it can gate a backend switch. The onnx
+backend needs `flask export-onnx` to have been run first.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Faculytics.src.ModelStore_functions import ModelStore
+from Faculytics.src.SentimentAnalysis_functions import SentimentAnalyzer
+from Faculytics.src.TopicModeling_functions import CommentProcessor
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "comments.csv")
+
+
+def run_backend(backend, comments, store):
+    analyzer = SentimentAnalyzer(store=store, batching=False, backend=backend)
+    sentiment = analyzer.predict(comments)
+
+    processor = CommentProcessor(classifier_mode="embedding", store=store, backend=backend)
+    cleaned = processor.preprocess_comments(pd.DataFrame({"comment": comments}))["cleaned_comment"].tolist()
+    embeddings = processor.encode_comments(cleaned)
+    topics, _ = processor.classify_by_similarity(embeddings)
+    return {
+        "predictions": sentiment["predictions"],
+        "probabilities": np.array(sentiment["probabilities"]),
+        "embeddings": embeddings,
+        "topics": topics
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--backends", nargs="+", default=["int8", "onnx"])
+    parser.add_argument("--min-agreement", type=float, default=0.98, help="Minimum sentiment and topic label agreement")
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Minimum embedding cosine similarity")
+    args = parser.parse_args()
+
+    comments = pd.read_csv(args.csv)["comment"].astype(str).tolist()
+    store = ModelStore()
+    reference = run_backend("fp32", comments, store)
+
+    failed = False
+    print(f"{len(comments)} comments from {args.csv}, reference fp32")
+    for backend in args.backends:
+        result = run_backend(backend, comments, store)
+
+        sentiment_agreement = np.mean([a == b for a, b in zip(reference["predictions"], result["predictions"])])
+        max_probability_diff = float(np.abs(reference["probabilities"] - result["probabilities"]).max())
+        cosine = np.sum(reference["embeddings"] * result["embeddings"], axis=1) / (
+            np.linalg.norm(reference["embeddings"], axis=1) * np.linalg.norm(result["embeddings"], axis=1)
+        )
+        topic_agreement = np.mean([a == b for a, b in zip(reference["topics"], result["topics"])])
+
+        ok = sentiment_agreement >= args.min_agreement and topic_agreement >= args.min_agreement and cosine.min() >= args.min_cosine
+        failed = failed or not ok
+        print(f"  {backend:<5} {'OK  ' if ok else 'FAIL'}"
+              f" sentiment agreement {sentiment_agreement:6.1%}  max prob diff {max_probability_diff:.4f}"
+              f"  embedding cosine min {cosine.min():.4f} mean {cosine.mean():.4f}"
+              f"  topic agreement {topic_agreement:6.1%}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Check that a fresh CommentProcessor reuses a saved corpus topic model.
+
+Usage:
+    python benchmarks/check_corpus_model_reuse.py [--csv benchmarks/fixtures/comments.csv] [--repeat 5]
+
+Fits a corpus model into a temporary directory from the fixture comments (repeated
+to reach the minimum corpus size), then builds a new CorpusTopicModel and
+CommentProcessor on that directory, as a freshly started worker or inference
+server would, and runs process_comments on the fixture. Exits with status 1 if
+the per-upload BERTopic refit (fit_transform) runs or the reported topic model
+version is not the saved one.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Faculytics.src.ModelStore_functions import ModelStore
+from Faculytics.src.TopicCorpus_functions import CorpusTopicModel
+from Faculytics.src.TopicModeling_functions import CommentProcessor
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "comments.csv")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--repeat", type=int, default=5, help="Copies of the fixture in the fitted corpus")
+    args = parser.parse_args()
+
+    comments = pd.read_csv(args.csv)["comment"].astype(str).tolist()
+    store = ModelStore()
+
+    with tempfile.TemporaryDirectory() as directory:
+        fitter = CommentProcessor(
+            classifier_mode="embedding",
+            corpus_model=CorpusTopicModel(directory, min_documents=len(comments)),
+            store=store
+        )
+        saved_version = fitter.fit_corpus_model(comments * args.repeat)
+
+        processor = CommentProcessor(
+            classifier_mode="embedding",
+            corpus_model=CorpusTopicModel(directory),
+            topic_model_mode="corpus",
+            store=store
+        )
+        refits = []
+        fit_transform = processor.topic_model.fit_transform
+        processor.topic_model.fit_transform = lambda *a, **kw: refits.append(1) or fit_transform(*a, **kw)
+
+        _, top_words, _, version = processor.process_comments(pd.DataFrame({"comment": comments}))
+
+    print(f"saved version {saved_version}, reported {version}, {len(refits)} refit(s), {len(top_words)} top words")
+    if refits or version != saved_version:
+        print("FAIL: a fresh processor did not reuse the saved corpus model")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
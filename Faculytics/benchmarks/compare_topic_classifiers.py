@@ -0,0 +1,68 @@
+"""
+Compare the embedding-similarity topic classifier against BART zero-shot.
+
+Usage:
+    python benchmarks/compare_topic_classifiers.py path/to/evaluation.csv
+
+The CSV needs the same 'comment' column that /upload expects. BART output is
+treated as the reference; the script prints overall agreement, per-label
+precision/recall of the embedding classifier and the wall time of each mode.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Faculytics.src.TopicModeling_functions import CommentProcessor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv_file")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N comments")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv_file)
+    if args.limit:
+        df = df.head(args.limit)
+
+    processor = CommentProcessor(classifier_mode="zero-shot")
+    comments = processor.preprocess_comments(df)["cleaned_comment"].tolist()
+
+    start = time.perf_counter()
+    embeddings = processor.encode_comments(comments)
+    embed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference, _ = processor.classify_comments(comments, mode="zero-shot")
+    zero_shot_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    candidate, _ = processor.classify_comments(comments, embeddings, mode="embedding")
+    embedding_time = time.perf_counter() - start
+
+    total = len(comments)
+    agree = sum(1 for ref, cand in zip(reference, candidate) if ref == cand)
+    print(f"Comments: {total}")
+    print(f"Agreement with BART zero-shot: {agree}/{total} ({agree / total * 100 if total else 0:.1f}%)")
+    print(f"Zero-shot time: {zero_shot_time:.2f}s")
+    print(f"Embedding time: {embedding_time:.3f}s (+ {embed_time:.2f}s MiniLM encoding, shared with BERTopic)")
+    print()
+
+    ref_counts = Counter(reference)
+    cand_counts = Counter(candidate)
+    hits = Counter(ref for ref, cand in zip(reference, candidate) if ref == cand)
+    print(f"{'Label':<40}{'BART':>7}{'Embed':>7}{'Prec':>8}{'Recall':>8}")
+    for label in processor.candidate_labels:
+        precision = hits[label] / cand_counts[label] if cand_counts[label] else 0.0
+        recall = hits[label] / ref_counts[label] if ref_counts[label] else 0.0
+        print(f"{label:<40}{ref_counts[label]:>7}{cand_counts[label]:>7}{precision:>8.2f}{recall:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Offline load test of the recommendation LLM client.
+
+Usage:
+    python benchmarks/load_llm_client.py [--requests 200] [--threads 32] [--latency-ms 300]
+        [--concurrency 4] [--failure-rate 0.1] [--timeout 30]
+
+Runs concurrent LLMClient.generate calls against the deterministic StubBackend,
+optionally failing a share of backend calls with retryable errors, and prints
+the client's stats: throughput under the concurrency cap, retries, rejections
+and the circuit breaker state. No API key or network access is needed; run the
+app with LLM_BACKEND=stub to load-test the whole upload pipeline the same way.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Faculytics.src.LLMClient_functions import LLMClient, LLMUnavailable, StubBackend
+
+
+class FlakyStubBackend(StubBackend):
+    """ StubBackend whose calls fail with a retryable error at the given rate """
+    def __init__(self, latency_ms, failure_rate, seed=0):
+        super().__init__(latency_ms)
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, system_instruction=None, temperature=0.4, timeout=None):
+        with self._lock:
+            fail = self._random.random() < self.failure_rate
+        if fail:
+            time.sleep(self.latency)
+            raise ConnectionError("simulated transport failure")
+        return super().generate(prompt, system_instruction, temperature, timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=32, help="Concurrent callers, e.g. upload job workers")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--concurrency", type=int, default=4, help="LLMClient max_concurrency")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--backoff", type=float, default=0.05)
+    args = parser.parse_args()
+
+    client = LLMClient(
+        FlakyStubBackend(args.latency_ms, args.failure_rate),
+        max_concurrency=args.concurrency,
+        timeout=args.timeout,
+        backoff=args.backoff
+    )
+
+    def call(i):
+        started = time.perf_counter()
+        try:
+            client.generate(f"Recommendation prompt {i}: " + "comment " * 200)
+            return True, time.perf_counter() - started
+        except LLMUnavailable:
+            return False, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(call, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(seconds for _, seconds in results)
+    ok = sum(1 for success, _ in results if success)
+    print(f"{args.requests} requests from {args.threads} threads in {elapsed:.2f}s ({args.requests / elapsed:.1f} req/s), {ok} succeeded")
+    print(f"caller latency p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} ms")
+    for key, value in client.stats().items():
+        print(f"  {key:20} {value:.1f}" if isinstance(value, float) else f"  {key:20} {value}")
+
+
+if __name__ == "__main__":
+    main()